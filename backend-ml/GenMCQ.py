@@ -1,10 +1,12 @@
-from langchain.agents import initialize_agent, Tool
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-from langchain_community.utilities import GoogleSerperAPIWrapper
-from typing import List, Dict
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from dotenv import load_dotenv
+from cacheHelper import normalize_text
+from metricsHelper import llm_metrics_callback, track_upstream
+from tracingHelper import span, traced
+from llmScheduler import scheduled_chat_groq
+from importHelper import load_dependencies
 import os
 import logging
 
@@ -17,11 +19,18 @@ load_dotenv()
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
 SERPER_API_KEY = os.getenv('SERPER_API_KEY')
 
-# Initialize ChatGroq model with the correct API key and parameters
-chat = ChatGroq(temperature=0.5, groq_api_key=GROQ_API_KEY, model_name="llama3-70b-8192")
+# Initialize ChatGroq model with the correct API key and parameters (on first use),
+# scheduled with the other Groq calls of this worker
+@lru_cache(maxsize=None)
+def get_chat():
+    return scheduled_chat_groq(temperature=0.5, groq_api_key=GROQ_API_KEY, model_name="llama3-70b-8192", callbacks=[llm_metrics_callback("groq")])
 
 # Initialize the Google search tool (using Serper API)
-serper = GoogleSerperAPIWrapper(serper_api_key=SERPER_API_KEY)
+@lru_cache(maxsize=None)
+def get_serper():
+    load_dependencies("langchain")
+    from langchain_community.utilities import GoogleSerperAPIWrapper
+    return GoogleSerperAPIWrapper(serper_api_key=SERPER_API_KEY)
 
 # Define system prompt for MCQ generation
 mcq_system = """
@@ -33,14 +42,27 @@ Generate {noq} MCQs on the given topic to assess the student's understanding. Ma
 Ensure that the questions cover different areas of the topic.
 """
 
-def generate_mcqs_with_llm(topic: str, noq: int, level: str) -> List[Dict]:
+# Human message asking for `noq` MCQs, listing the questions the caller already has
+def mcq_request_message(topic: str, noq: int, exclude: Optional[List[str]] = None) -> str:
     human = f"Generate {noq} MCQs on the topic: {topic}"
+    if exclude:
+        # Braces would otherwise be read as prompt template variables
+        avoided = "\n".join(f"- {q}" for q in exclude).replace("{", "{{").replace("}", "}}")
+        human += f"\nDo not repeat any of these questions:\n{avoided}"
+    return human
+
+def generate_mcqs_with_llm(topic: str, noq: int, level: str, exclude: Optional[List[str]] = None) -> List[Dict]:
+    human = mcq_request_message(topic, noq, exclude)
+    load_dependencies("langchain")
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain.chains import LLMChain
     prompt = ChatPromptTemplate.from_messages([("system", mcq_system), ("human", human)])
-    chain = LLMChain(prompt=prompt, llm=chat)
+    chain = LLMChain(prompt=prompt, llm=get_chat())
     
     try:
-        response = chain.run({"topic": topic, "noq": noq, "level": level})
-        logger.info(f"LLM Response: {response}")
+        with span("mcq.generate_chunk", noq=noq, excluded=len(exclude or [])):
+            response = chain.run({"topic": topic, "noq": noq, "level": level})
+        logger.debug(f"LLM Response: {response}")
         
         mcqs = parse_mcqs_from_response(response)
         if not mcqs:
@@ -51,35 +73,145 @@ def generate_mcqs_with_llm(topic: str, noq: int, level: str) -> List[Dict]:
         logger.error(f"Error in generate_mcqs_with_llm: {e}")
         return []
 
+def parse_mcq_block(q: str) -> Optional[Dict]:
+    try:
+        question_part, correct_part = q.split("Correct:")
+        lines = question_part.split("\n")
+        options = [line.split(") ")[1].strip() for line in lines if line.strip()[:2] in ['A)', 'B)', 'C)', 'D)']]
+        question = question_part.split("\n")[1].strip()
+        correct_letter = correct_part.split(")")[0].strip()
+        correct_index = ord(correct_letter) - ord('A')
+        
+        return {
+            "question": question,
+            "options": options,
+            "correct": correct_index
+        }
+    except Exception as e:
+        logger.error(f"Error parsing question: {e}")
+        return None
+
 def parse_mcqs_from_response(response: str) -> List[Dict]:
     mcqs = []
     questions = response.split("**MCQ")
     
     for q in questions[1:]:
         if "Correct:" in q:
-            try:
-                question_part, correct_part = q.split("Correct:")
-                lines = question_part.split("\n")
-                options = [line.split(") ")[1].strip() for line in lines if line.strip()[:2] in ['A)', 'B)', 'C)', 'D)']]
-                question = question_part.split("\n")[1].strip()
-                correct_letter = correct_part.split(")")[0].strip()
-                correct_index = ord(correct_letter) - ord('A')
-                
-                mcqs.append({
-                    "question": question,
-                    "options": options,
-                    "correct": correct_index
-                })
-            except Exception as e:
-                logger.error(f"Error parsing question: {e}")
+            mcq = parse_mcq_block(q)
+            if mcq:
+                mcqs.append(mcq)
     
     return mcqs
 
+class MCQStreamParser:
+    """
+    Incremental counterpart of parse_mcqs_from_response: feed it streamed text and it returns
+    each MCQ as soon as the line holding its `Correct:` answer is complete.
+    """
+
+    MARKER = "**MCQ"
+
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text: str) -> List[Dict]:
+        self.buffer += text
+        mcqs = []
+        while True:
+            start = self.buffer.find(self.MARKER)
+            if start == -1:
+                # Keep a possible partial marker at the end of the buffer
+                self.buffer = self.buffer[-(len(self.MARKER) - 1):]
+                break
+            self.buffer = self.buffer[start:]
+            correct = self.buffer.find("Correct:")
+            next_start = self.buffer.find(self.MARKER, len(self.MARKER))
+            if next_start != -1 and (correct == -1 or next_start < correct):
+                # Question without an answer, skipped like in parse_mcqs_from_response
+                self.buffer = self.buffer[next_start:]
+                continue
+            if correct == -1:
+                break
+            end = self.buffer.find("\n", correct)
+            if end == -1:
+                break
+            mcq = parse_mcq_block(self.buffer[len(self.MARKER):end])
+            if mcq:
+                mcqs.append(mcq)
+            self.buffer = self.buffer[end:]
+        return mcqs
+
+    def close(self) -> List[Dict]:
+        mcqs = self.feed("\n")
+        self.buffer = ""
+        return mcqs
+
+def stream_mcqs_with_llm(topic: str, noq: int, level: str, exclude: Optional[List[str]] = None):
+    """Generate MCQs like generate_mcqs_with_llm, yielding each one as soon as the model has written it."""
+    human = mcq_request_message(topic, noq, exclude)
+    load_dependencies("langchain")
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = ChatPromptTemplate.from_messages([("system", mcq_system), ("human", human)])
+    chain = prompt | get_chat()
+    parser = MCQStreamParser()
+    try:
+        for chunk in chain.stream({"topic": topic, "noq": noq, "level": level}):
+            yield from parser.feed(chunk.content)
+        yield from parser.close()
+    except Exception as e:
+        logger.error(f"Error in stream_mcqs_with_llm: {e}")
+
+# Most questions a single request may ask for
+MAX_NOQ = int(os.getenv('MAX_NOQ', 50))
+# Number of questions asked of the model per call in chunked generation
+MCQ_CHUNK_SIZE = int(os.getenv('MCQ_CHUNK_SIZE', 5))
+# Shared pool bounding concurrent chunk calls across all requests
+mcq_pool = ThreadPoolExecutor(max_workers=int(os.getenv('MCQ_POOL_SIZE', 8)), thread_name_prefix="mcq")
+
+def dedupe_mcqs(mcqs: List[Dict], seen: Optional[set] = None) -> List[Dict]:
+    seen = set() if seen is None else seen
+    unique = []
+    for mcq in mcqs:
+        key = normalize_text(mcq["question"])
+        if key not in seen:
+            seen.add(key)
+            unique.append(mcq)
+    return unique
+
+def generate_mcqs_chunked(topic: str, noq: int, level: str, chunk_size: int = MCQ_CHUNK_SIZE, max_rounds: int = 3,
+                          exclude: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Split a request for `noq` MCQs into concurrent calls of at most `chunk_size` questions,
+    merge them and drop duplicate questions, including any of the `exclude` questions the caller
+    already has. Missing questions (duplicates or failed chunks) are requested again, up to
+    `max_rounds` rounds, so exactly `noq` MCQs are returned unless the model keeps failing.
+    At most MAX_NOQ questions are generated per call.
+    """
+    noq = min(noq, MAX_NOQ)
+    mcqs = []
+    exclude = list(exclude or [])
+    seen = {normalize_text(question) for question in exclude}
+    for _ in range(max_rounds):
+        missing = noq - len(mcqs)
+        if missing <= 0:
+            break
+        chunks = [chunk_size] * (missing // chunk_size) + ([missing % chunk_size] if missing % chunk_size else [])
+        avoided = exclude + [mcq["question"] for mcq in mcqs] or None
+        if len(chunks) == 1:
+            results = [generate_mcqs_with_llm(topic, chunks[0], level, avoided)]
+        else:
+            futures = [mcq_pool.submit(traced(generate_mcqs_with_llm), topic, n, level, avoided) for n in chunks]
+            results = [future.result() for future in futures]
+        for result in results:
+            mcqs.extend(dedupe_mcqs(result, seen))
+    return mcqs[:noq]
+
 def generate_mcqs_with_google_search(topic: str, noq: int) -> List[Dict]:
     search_query = f"multiple choice questions on {topic} with answers"
     try:
-        google_search_results = serper.run(search_query)
-        logger.info(f"Google Search Results: {google_search_results}")
+        with track_upstream("serper", "mcq_search"):
+            google_search_results = get_serper().run(search_query)
+        logger.debug(f"Google Search Results: {google_search_results}")
         
         mcqs = []
         if isinstance(google_search_results, dict):
@@ -115,7 +247,7 @@ def generate_report(score: int, total: int) -> str:
     return report
 
 def generate_mcqs(topic: str, noq: int, level: str) -> List[Dict]:
-    mcqs = generate_mcqs_with_llm(topic, noq, level)
+    mcqs = generate_mcqs_chunked(topic, noq, level)
     if not mcqs:
         logger.info("Falling back to Google Search for generating MCQs...")
         mcqs = generate_mcqs_with_google_search(topic, noq)
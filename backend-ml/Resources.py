@@ -1,15 +1,55 @@
 from fastapi import FastAPI, HTTPException
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from cacheHelper import TTLCache, make_key
+from metricsHelper import track_upstream
+from tracingHelper import span, traced
 import json
 import os
+import asyncio
+import logging
 app = FastAPI()
 
+logger = logging.getLogger(__name__)
+
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 
+# Provider endpoints, overridable to point at local stand-ins (see benchmarks/)
+YOUTUBE_API_URL = os.getenv('YOUTUBE_API_URL', "https://www.googleapis.com/youtube/v3/search")
+SERPAPI_URL = os.getenv('SERPAPI_URL', "https://serpapi.com/search.json")
+
+# Per-provider deadline (seconds) for a single upstream call
+PROVIDER_TIMEOUT = float(os.getenv('RESOURCES_PROVIDER_TIMEOUT', 5))
+
+# Shared keep-alive connection pool for serpapi.com and googleapis.com
+RESOURCES_POOL_SIZE = int(os.getenv('RESOURCES_POOL_SIZE', 16))
+http = requests.Session()
+http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=RESOURCES_POOL_SIZE)
+http.mount("https://", http_adapter)
+http.mount("http://", http_adapter)
+
+# Threads of their own for provider calls, one per pooled connection, so a provider's deadline
+# is not spent queueing behind unrelated asyncio.to_thread work in the default executor
+resources_pool = ThreadPoolExecutor(max_workers=RESOURCES_POOL_SIZE, thread_name_prefix="resources")
+
+# Provider responses keyed by provider and normalized query, persisted across restarts
+resource_cache = TTLCache(
+    maxsize=int(os.getenv('RESOURCES_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('RESOURCES_CACHE_TTL', 86400)),
+    path=os.getenv('RESOURCES_CACHE_PATH', 'resources_cache.db'),
+    max_disk_entries=int(os.getenv('RESOURCES_CACHE_MAX_ENTRIES', 20000)),
+)
+# Empty results are often a provider hiccup, so they are only kept briefly
+RESOURCES_EMPTY_TTL = int(os.getenv('RESOURCES_EMPTY_TTL', 300))
+
+def cache_results(cache_key, results):
+    resource_cache.set(cache_key, results, ttl=None if results else RESOURCES_EMPTY_TTL)
+
 
 # YouTube search function (using the YouTube Data API with API key)
 def youtube_searchs(query: str, num_results: int = 5) -> list:
-    API_URL = "https://www.googleapis.com/youtube/v3/search"
+    API_URL = YOUTUBE_API_URL
     API_KEY = YOUTUBE_API_KEY  # Your API key
     params = {
         "part": "snippet",
@@ -18,10 +58,15 @@ def youtube_searchs(query: str, num_results: int = 5) -> list:
         "maxResults": num_results,
         "key": API_KEY
     }
+    cache_key = make_key("youtube", query, num_results)
+    cached = resource_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        response = requests.get(API_URL, params=params)
-        response.raise_for_status()
+        with track_upstream("youtube", "resources_search"):
+            response = http.get(API_URL, params=params, timeout=PROVIDER_TIMEOUT)
+            response.raise_for_status()
         results = response.json()
 
         youtube_results = []
@@ -38,6 +83,7 @@ def youtube_searchs(query: str, num_results: int = 5) -> list:
                     'description': description
                 })
 
+        cache_results(cache_key, youtube_results)
         return youtube_results
     except requests.exceptions.RequestException as e:
         print(f"Request error: {e}")
@@ -46,16 +92,21 @@ def youtube_searchs(query: str, num_results: int = 5) -> list:
 
 # GeeksForGeeks search function
 def geeks_for_geeks_search(query, api_key):
-    API_URL = "https://serpapi.com/search.json"
+    API_URL = SERPAPI_URL
     params = {
         "q": f"site:geeksforgeeks.org {query}",
         "num": 3,
         "api_key": api_key
     }
+    cache_key = make_key("geeksforgeeks", query)
+    cached = resource_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        response = requests.get(API_URL, params=params)
-        response.raise_for_status()
+        with track_upstream("serpapi", "geeksforgeeks_search"):
+            response = http.get(API_URL, params=params, timeout=PROVIDER_TIMEOUT)
+            response.raise_for_status()
         results = response.json()
 
         search_results = []
@@ -69,6 +120,7 @@ def geeks_for_geeks_search(query, api_key):
                 'snippet': snippet
             })
 
+        cache_results(cache_key, search_results)
         return search_results
     except requests.exceptions.RequestException as e:
         print(f"Request error: {e}")
@@ -79,16 +131,21 @@ MEDIUM_API_KEY = os.getenv('MEDIUM_API_KEY')
 
 # Medium search function
 def medium_search(query):
-    API_URL = "https://serpapi.com/search.json"
+    API_URL = SERPAPI_URL
     params = {
         "q": f"site:medium.com {query}",
         "num": 3,
         "api_key": MEDIUM_API_KEY
     }
+    cache_key = make_key("medium", query)
+    cached = resource_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     try:
-        response = requests.get(API_URL, params=params)
-        response.raise_for_status()
+        with track_upstream("serpapi", "medium_search"):
+            response = http.get(API_URL, params=params, timeout=PROVIDER_TIMEOUT)
+            response.raise_for_status()
         results = response.json()
 
         search_results = []
@@ -102,6 +159,7 @@ def medium_search(query):
                 'snippet': snippet
             })
 
+        cache_results(cache_key, search_results)
         return search_results
     except requests.exceptions.RequestException as e:
         print(f"Request error: {e}")
@@ -118,6 +176,31 @@ def searchResources(query):
     api_key = GEEKSFORGEEKS_API_KEY
     geeksforgeeks_results = geeks_for_geeks_search(query, api_key)
 
+    return combine_results(medium_results, youtube_results, geeksforgeeks_results)
+
+# Combined search that queries all providers in parallel. A provider that misses its
+# deadline or fails contributes no results instead of failing or stalling the request.
+async def searchResources_async(query, timeout=PROVIDER_TIMEOUT):
+    loop = asyncio.get_running_loop()
+
+    async def call(name, func, *args):
+        try:
+            with span(f"resources.{name.lower()}"):
+                return await asyncio.wait_for(loop.run_in_executor(resources_pool, traced(func), *args), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} search timed out after {timeout}s")
+        except Exception as e:
+            logger.error(f"{name} search failed: {e}")
+        return []
+
+    medium_results, youtube_results, geeksforgeeks_results = await asyncio.gather(
+        call("Medium", medium_search, query),
+        call("YouTube", youtube_searchs, query),
+        call("GeeksforGeeks", geeks_for_geeks_search, query, GEEKSFORGEEKS_API_KEY),
+    )
+    return combine_results(medium_results, youtube_results, geeksforgeeks_results)
+
+def combine_results(medium_results, youtube_results, geeksforgeeks_results):
     combined_results = {
         'medium': medium_results,
         'youtube': youtube_results,
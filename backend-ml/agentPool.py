@@ -0,0 +1,68 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class AgentPool:
+    """
+    Long-lived agents built once by `factory` and checked out one request at a time,
+    so request handlers no longer pay for agent, prompt and tool construction.
+    At most `size` agents exist; extra requests wait up to `timeout` seconds for one to be
+    released or for a failed build to free its slot, then get a TimeoutError.
+    """
+
+    def __init__(self, factory, size=4, timeout=60):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self._created = 0
+        self._idle = []
+        self._changed = asyncio.Condition()
+
+    async def _build(self):
+        try:
+            return await asyncio.to_thread(self.factory)
+        except BaseException:
+            # Give the slot back so the next request can try again instead of waiting forever
+            async with self._changed:
+                self._created -= 1
+                self._changed.notify()
+            raise
+
+    async def warm(self):
+        while True:
+            async with self._changed:
+                if self._created >= self.size:
+                    return
+                self._created += 1
+            try:
+                agent = await self._build()
+            except Exception as e:
+                logger.error(f"Could not pre-build agent: {e}")
+                return
+            async with self._changed:
+                self._idle.append(agent)
+                self._changed.notify()
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._changed:
+            await asyncio.wait_for(
+                self._changed.wait_for(lambda: self._idle or self._created < self.size), self.timeout
+            )
+            agent = self._idle.pop() if self._idle else None
+            if agent is None:
+                self._created += 1
+        if agent is None:
+            agent = await self._build()
+        try:
+            yield agent
+        finally:
+            async with self._changed:
+                self._idle.append(agent)
+                self._changed.notify()
+
+    def stats(self):
+        return {"size": self.size, "created": self._created, "idle": len(self._idle)}
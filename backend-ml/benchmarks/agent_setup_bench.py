@@ -0,0 +1,47 @@
+# Microbenchmark: per-request agent setup cost for /search, before and after the agent pool.
+# Usage (from backend-ml/): python benchmarks/agent_setup_bench.py --requests 200
+# No network calls are made; only agent construction and pool checkout are timed.
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("SERPER_API_KEY", "bench")
+
+import main
+from agentPool import AgentPool
+
+
+def bench_per_request(n):
+    # Exclude the one-time lazy LangChain import from the per-request cost
+    main.initialize_custom_agent()
+    start = time.perf_counter()
+    for _ in range(n):
+        main.initialize_custom_agent()
+    return (time.perf_counter() - start) / n
+
+
+async def bench_pool(n, size):
+    pool = AgentPool(main.initialize_custom_agent, size=size)
+    await pool.warm()
+    start = time.perf_counter()
+    for _ in range(n):
+        async with pool.acquire():
+            pass
+    return (time.perf_counter() - start) / n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    before = bench_per_request(args.requests)
+    after = asyncio.run(bench_pool(args.requests, args.pool_size))
+    print(f"initialize_custom_agent() per request: {before * 1e6:10.1f} us")
+    print(f"AgentPool.acquire() per request:       {after * 1e6:10.1f} us")
+    print(f"speedup: {before / after:.0f}x")
@@ -0,0 +1,219 @@
+# Endpoint load benchmark against local stand-ins for Groq, SerpAPI, YouTube and Gemini.
+# Starts the stub server and the FastAPI app (uvicorn subprocess), drives each endpoint with
+# concurrent requests and reports p50/p95/p99 latency and requests per second.
+# Usage (from backend-ml/):
+#   python benchmarks/endpoint_bench.py --requests 200 --concurrency 20
+#   python benchmarks/endpoint_bench.py --endpoints query,generate-mcqs --profile groq=800:0.02 --json run.json
+#   python benchmarks/endpoint_bench.py --baseline run.json --max-regression 0.2   # exit 1 on p95 regression
+# Not covered offline: /search tool calls to Serper, Gemini video upload, and gTTS synthesis,
+# which have no configurable endpoint; /video-query measures job submission only.
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_servers import Profile, app_environment, parse_profile, start_stub_server
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+DEFAULT_PROFILES = {
+    "groq": Profile(latency=0.3, jitter=0.05, token_delay=0.005),
+    "serpapi": Profile(latency=0.15, jitter=0.03),
+    "youtube": Profile(latency=0.1, jitter=0.02),
+    "gemini": Profile(latency=0.5, jitter=0.1),
+}
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+# name -> (method, path, streamed, request kwargs for request i)
+SCENARIOS = {
+    "query": ("POST", "/query", False, lambda i: {"json": {"query": f"What is a stack? ({i})", "history": []}}),
+    "query-stream": ("POST", "/query/stream", True, lambda i: {"json": {"query": f"Why is binary search O(log n)? ({i})", "history": []}}),
+    "session-query": ("POST", "/session-query", False, lambda i: {"json": {"query": f"How does a queue differ from a stack? ({i})"}}),
+    "search": ("POST", "/search", False, lambda i: {"json": {"query": f"Explain Dijkstra's algorithm ({i})"}}),
+    "generate-mcqs": ("POST", "/generate-mcqs", False, lambda i: {"json": {"topic": f"stack {i}", "noq": 5, "level": "easy"}}),
+    "generate-mcqs-stream": ("POST", "/generate-mcqs/stream", True, lambda i: {"json": {"topic": f"queue {i}", "noq": 5, "level": "easy"}}),
+    "generate-mcqs-batch": ("POST", "/generate-mcqs/batch", False, lambda i: {"json": {"requests": [
+        {"topic": f"{topic} {i}", "noq": 5, "level": "medium"} for topic in ("stack", "queue", "heap", "trie")
+    ]}}),
+    "resources": ("POST", "/resources", False, lambda i: {"json": {"query": f"binary search tree {i}"}}),
+    "image-query": ("POST", "/image-query", False, lambda i: {
+        "files": {"image": ("stub.png", TINY_PNG, "image/png")}, "data": {"query_text": f"What is shown here? ({i})"}
+    }),
+    "video-query": ("POST", "/video-query", False, lambda i: {
+        "files": {"video": ("stub.mp4", b"\x00" * 1024, "video/mp4")}, "data": {"query_text": f"Summarize ({i})"}
+    }),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(env, port):
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("App exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/cache-stats", timeout=1).status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("App did not start within 60s")
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+async def one_request(client, method, path, streamed, kwargs):
+    start = time.perf_counter()
+    ttfb = None
+    if streamed:
+        async with client.stream(method, path, **kwargs) as response:
+            async for _ in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+            status = response.status_code
+    else:
+        response = await client.request(method, path, **kwargs)
+        status = response.status_code
+    return time.perf_counter() - start, ttfb, status
+
+
+async def run_scenario(base_url, name, requests, concurrency, warmup):
+    method, path, streamed, make_kwargs = SCENARIOS[name]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        for i in range(warmup):
+            await one_request(client, method, path, streamed, make_kwargs(-1 - i))
+
+        semaphore = asyncio.Semaphore(concurrency)
+        results = []
+
+        async def worker(i):
+            async with semaphore:
+                try:
+                    results.append(await one_request(client, method, path, streamed, make_kwargs(i)))
+                except httpx.HTTPError:
+                    results.append((None, None, None))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _, status in results if status is not None and status < 400]
+    ttfbs = [ttfb for _, ttfb, status in results if ttfb is not None and status is not None and status < 400]
+    return {
+        "endpoint": name,
+        "requests": requests,
+        "errors": requests - len(latencies),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "ttfb_p50_ms": percentile(ttfbs, 50) * 1000 if streamed else None,
+    }
+
+
+def print_report(results):
+    print(f"\n{'endpoint':<22}{'n':>6}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ttfb p50':>10}")
+    for r in results:
+        ttfb = f"{r['ttfb_p50_ms']:.0f}" if r["ttfb_p50_ms"] is not None else "-"
+        print(f"{r['endpoint']:<22}{r['requests']:>6}{r['errors']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}{ttfb:>10}")
+
+
+# Endpoints whose p95 grew by more than max_regression relative to the baseline run
+def regressions(results, baseline, max_regression):
+    previous = {r["endpoint"]: r for r in baseline}
+    failed = []
+    for r in results:
+        before = previous.get(r["endpoint"])
+        if before and r["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+            failed.append((r["endpoint"], before["p95_ms"], r["p95_ms"]))
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoints", default=",".join(SCENARIOS), help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--profile", action="append", type=parse_profile, default=[],
+                        help="provider=latency_ms[:error_rate[:rate_limit_rate]], repeatable")
+    parser.add_argument("--app-env", action="append", default=[], help="extra NAME=VALUE for the app, repeatable")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file from a previous run to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    profiles = dict(DEFAULT_PROFILES, **dict(args.profile))
+    stub, stub_url = start_stub_server(profiles)
+    workdir = tempfile.mkdtemp(prefix="endpoint_bench_")
+    env = dict(os.environ, **app_environment(stub_url))
+    env.update({
+        "MCQ_BANK_PATH": os.path.join(workdir, "mcq_bank.db"),
+        "RESOURCES_CACHE_PATH": os.path.join(workdir, "resources_cache.db"),
+        "AUDIO_DIR": os.path.join(workdir, "audio"),
+        "UPLOAD_DIR": workdir,
+    })
+    env.update(dict(item.split("=", 1) for item in args.app_env))
+
+    port = free_port()
+    app = start_app(env, port)
+    try:
+        results = []
+        for name in names:
+            result = asyncio.run(run_scenario(f"http://127.0.0.1:{port}", name, args.requests, args.concurrency, args.warmup))
+            results.append(result)
+            print(f"{name}: done")
+    finally:
+        app.terminate()
+        app.wait()
+        stub.shutdown()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failed = regressions(results, json.load(f), args.max_regression)
+        for endpoint, before, after in failed:
+            print(f"REGRESSION {endpoint}: p95 {before:.0f} ms -> {after:.0f} ms")
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
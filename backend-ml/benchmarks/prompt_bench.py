@@ -0,0 +1,65 @@
+# Prompt budget benchmark: prompt size and /query latency as a conversation grows, with the full
+# history (no budget) versus the token-budgeted history. Runs against the local Groq stand-in,
+# whose latency grows with prompt size (--ms-per-1k-tokens).
+# Usage (from backend-ml/): python benchmarks/prompt_bench.py --max-turns 200 --step 25 --budget 3000
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from stub_servers import Profile, app_environment, start_stub_server
+
+STUDENT_TURN = "I think a stack works by adding elements on top and removing them from the top as well, so the last one in is the first one out, which is why it is called LIFO. "
+ASSISTANT_TURN = "That's a good observation. Now consider what happens to the order of elements if you push one, two and three and then pop twice. Which element is left, and why? "
+
+
+def session_history(turns):
+    return [{"student": f"({i}) {STUDENT_TURN * 2}", "assistant": ASSISTANT_TURN * 2} for i in range(turns)]
+
+
+async def measure(main, turns, budget, repeats):
+    main.PROMPT_MAX_TOKENS = budget
+    history = session_history(turns)
+    latencies = []
+    for r in range(repeats):
+        # A new query each time so the response cache is never hit
+        query = f"So is a queue the opposite of a stack? ({turns}, {budget}, {r})"
+        prompt = main.build_socratic_prompt(query, history)
+        tokens = sum(main.count_tokens(m.content) for m in prompt.format_messages(student_query=query))
+        start = time.perf_counter()
+        await main.socratic_conversation_async(query, history)
+        latencies.append(time.perf_counter() - start)
+    return tokens, sorted(latencies)[len(latencies) // 2]
+
+
+async def run(args):
+    import main
+    # The first call pays for loading LangChain and the Groq client
+    await main.socratic_conversation_async("warm-up", [])
+    print(f"{'turns':>6}{'full tokens':>14}{'full ms':>10}{'budget tokens':>16}{'budget ms':>11}")
+    for turns in range(0, args.max_turns + 1, args.step):
+        full_tokens, full_latency = await measure(main, turns, 10 ** 9, args.repeats)
+        budget_tokens, budget_latency = await measure(main, turns, args.budget, args.repeats)
+        print(f"{turns:>6}{full_tokens:>14}{full_latency * 1000:>10.0f}{budget_tokens:>16}{budget_latency * 1000:>11.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--step", type=int, default=25)
+    parser.add_argument("--budget", type=int, default=3000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=100)
+    args = parser.parse_args()
+
+    profile = Profile(latency=args.latency_ms / 1000, latency_per_1k_tokens=args.ms_per_1k_tokens / 1000)
+    stub, stub_url = start_stub_server({"groq": profile})
+    os.environ.update(app_environment(stub_url), PREWARM_ON_STARTUP="0")
+    try:
+        asyncio.run(run(args))
+    finally:
+        stub.shutdown()
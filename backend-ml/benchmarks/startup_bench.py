@@ -0,0 +1,85 @@
+# Startup benchmark: how long a fresh worker takes to import the app, broken down per module,
+# and what each lazily loaded dependency costs on first use.
+# Usage (from backend-ml/): python benchmarks/startup_bench.py --top 15 --runs 3
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+ENV = dict(os.environ, GROQ_API_KEY="bench", SERPER_API_KEY="bench", GOOGLE_API_KEY="bench", PREWARM_ON_STARTUP="0")
+
+# First-use cost of each lazy loader, measured in a fresh interpreter after `import main`
+LAZY_LOADERS = {
+    "/query, /session-query (ChatGroq)": "main.get_chat()",
+    "/search (agent + tools)": "main.initialize_custom_agent()",
+    "/generate-mcqs (ChatGroq)": "GenMCQ.get_chat()",
+    "/image-query, /video-query (Gemini)": "multimodelHelper.get_model()",
+    "/stream-audio (gTTS)": "__import__('gtts')",
+    "/image-query (PIL)": "__import__('PIL.Image')",
+}
+
+
+def run_python(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, env=ENV, capture_output=True, text=True, check=True,
+    )
+    return result.stdout, result.stderr
+
+
+# Parse `-X importtime` output into {package imported by main: cumulative microseconds}
+def import_times(stderr):
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Nesting is shown as two spaces per level; level 1 is what main imports itself
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            root = name.strip().split(".")[0]
+            times[root] = times.get(root, 0) + int(cumulative)
+    return times
+
+
+def measure_import(runs):
+    walls = []
+    per_module = {}
+    for _ in range(runs):
+        stdout, stderr = run_python(
+            "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+        )
+        walls.append(float(stdout.strip().splitlines()[-1]))
+        for name, us in import_times(stderr).items():
+            per_module.setdefault(name, []).append(us)
+    return walls, {name: statistics.median(values) for name, values in per_module.items()}
+
+
+def measure_lazy(loader):
+    stdout, _ = run_python(
+        "import time, main, GenMCQ, multimodelHelper\n"
+        f"t = time.perf_counter(); {loader}; print(time.perf_counter() - t)"
+    )
+    return float(stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    walls, per_module = measure_import(args.runs)
+    print(f"import main: median {statistics.median(walls) * 1000:.0f} ms over {args.runs} runs")
+    print(f"\n{'module':<32}{'cumulative import (ms)':>24}")
+    for name, us in sorted(per_module.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32}{us / 1000:>24.1f}")
+
+    print(f"\n{'first use per endpoint':<40}{'ms':>10}")
+    for endpoint, loader in LAZY_LOADERS.items():
+        print(f"{endpoint:<40}{measure_lazy(loader) * 1000:>10.0f}")
@@ -0,0 +1,228 @@
+# Local stand-ins for Groq, SerpAPI, the YouTube Data API and Gemini, with configurable latency
+# and error profiles, so the endpoints can be load-tested offline.
+# Run standalone: python benchmarks/stub_servers.py --port 9100 --profile groq=800:0.01:0.02
+# and point the app at it with the environment printed on startup.
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+PROVIDERS = ("groq", "serpapi", "youtube", "gemini")
+
+
+@dataclass
+class Profile:
+    latency: float = 0.0                # seconds before the response starts
+    jitter: float = 0.0                 # +/- uniform jitter, seconds
+    error_rate: float = 0.0             # fraction of requests answered with a 500
+    rate_limit_rate: float = 0.0        # fraction of requests answered with a 429
+    latency_per_1k_tokens: float = 0.0  # extra prompt-size dependent latency (Groq only)
+    token_delay: float = 0.0            # delay between streamed tokens (Groq only)
+
+    def delay(self, prompt_tokens=0):
+        base = self.latency + random.uniform(-self.jitter, self.jitter)
+        return max(0.0, base + self.latency_per_1k_tokens * prompt_tokens / 1000)
+
+
+# Parse "groq=800:0.01:0.02" (latency ms, error rate, rate-limit rate) into (provider, Profile)
+def parse_profile(spec):
+    provider, _, values = spec.partition("=")
+    if provider not in PROVIDERS:
+        raise argparse.ArgumentTypeError(f"unknown provider {provider!r}, expected one of {PROVIDERS}")
+    parts = [float(v) for v in values.split(":") if v]
+    profile = Profile()
+    if parts:
+        profile.latency = parts[0] / 1000
+    if len(parts) > 1:
+        profile.error_rate = parts[1]
+    if len(parts) > 2:
+        profile.rate_limit_rate = parts[2]
+    return provider, profile
+
+
+def count_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def mcq_text(noq):
+    blocks = []
+    for i in range(1, noq + 1):
+        blocks.append(
+            f"**MCQ {i}**\nStub question {i} {uuid.uuid4().hex[:8]}?\n\n"
+            f"A) Option A\nB) Option B\nC) Option C\nD) Option D\nCorrect: B) Option B\n"
+        )
+    return "Here are the MCQs:\n\n" + "\n".join(blocks)
+
+
+# Pick a plausible completion for the app's different Groq prompts
+def groq_completion(messages):
+    system = " ".join(m.get("content", "") for m in messages if m.get("role") == "system")
+    text = " ".join(m.get("content", "") for m in messages)
+    if "multiple-choice questions" in system:
+        match = re.search(r"Generate (\d+) MCQs", text)
+        return mcq_text(int(match.group(1)) if match else 5)
+    if "running summary" in system:
+        return "The student is learning about stacks and has understood LIFO ordering."
+    if "Final Answer" in text:
+        return "Thought: I can answer directly.\nFinal Answer: A stack is a LIFO data structure."
+    return "Good question! What happens to the most recently added element when you remove one from a stack?"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    profiles = {}
+
+    def log_message(self, *args):
+        pass
+
+    def provider(self):
+        path = urlparse(self.path).path
+        if path.startswith("/openai/"):
+            return "groq"
+        if path.startswith("/v1beta/"):
+            return "gemini"
+        if path.startswith("/youtube/"):
+            return "youtube"
+        if path.startswith("/search.json"):
+            return "serpapi"
+        return None
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Apply the provider's latency and error profile; returns False if an error was sent
+    def simulate(self, provider, prompt_tokens=0):
+        profile = self.profiles.get(provider, Profile())
+        time.sleep(profile.delay(prompt_tokens))
+        roll = random.random()
+        if roll < profile.rate_limit_rate:
+            self.send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}, {"Retry-After": "1"})
+            return False
+        if roll < profile.rate_limit_rate + profile.error_rate:
+            self.send_json(500, {"error": {"message": "Stub upstream error", "type": "server_error"}})
+            return False
+        return True
+
+    def do_GET(self):
+        provider = self.provider()
+        query = parse_qs(urlparse(self.path).query)
+        if provider == "serpapi":
+            if self.simulate(provider):
+                q = query.get("q", [""])[0]
+                self.send_json(200, {"organic_results": [
+                    {"title": f"{q} result {i}", "link": f"https://example.com/{i}", "snippet": "Stub snippet"}
+                    for i in range(int(query.get("num", ["3"])[0]))
+                ]})
+        elif provider == "youtube":
+            if self.simulate(provider):
+                q = query.get("q", [""])[0]
+                self.send_json(200, {"items": [
+                    {"id": {"videoId": f"stub{i}"}, "snippet": {"title": f"{q} video {i}", "description": "Stub video"}}
+                    for i in range(int(query.get("maxResults", ["5"])[0]))
+                ]})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        provider = self.provider()
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if provider == "groq":
+            self.groq(payload)
+        elif provider == "gemini":
+            if self.simulate(provider):
+                self.send_json(200, {
+                    "candidates": [{
+                        "content": {"parts": [{"text": "The image shows a stack of plates, a classic LIFO example."}], "role": "model"},
+                        "finishReason": "STOP",
+                        "index": 0,
+                    }],
+                    "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 20, "totalTokenCount": 320},
+                })
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def groq(self, payload):
+        messages = payload.get("messages", [])
+        prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+        if not self.simulate("groq", prompt_tokens):
+            return
+        content = groq_completion(messages)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(content),
+                 "total_tokens": prompt_tokens + count_tokens(content)}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": payload.get("model", "stub")}
+        if not payload.get("stream"):
+            self.send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ]))
+            return
+        token_delay = self.profiles.get("groq", Profile()).token_delay
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for token in re.findall(r"\S+\s*", content):
+            chunk = dict(base, object="chat.completion.chunk", choices=[
+                {"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}
+            ])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(token_delay)
+        final = dict(base, object="chat.completion.chunk", x_groq={"usage": usage}, choices=[
+            {"index": 0, "delta": {}, "finish_reason": "stop"}
+        ])
+        self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+
+
+def start_stub_server(profiles, host="127.0.0.1", port=0):
+    """Start the stand-in server in a daemon thread; returns (server, base_url)."""
+    handler = type("ProfiledStubHandler", (StubHandler,), {"profiles": dict(profiles)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+# Environment that points the app's providers at the stand-in server
+def app_environment(base_url):
+    return {
+        "GROQ_API_BASE": base_url,
+        "GROQ_API_KEY": "stub",
+        "SERPER_API_KEY": "stub",
+        "SERPAPI_URL": f"{base_url}/search.json",
+        "YOUTUBE_API_URL": f"{base_url}/youtube/v3/search",
+        "YOUTUBE_API_KEY": "stub",
+        "MEDIUM_API_KEY": "stub",
+        "GEEKSFORGEEKS_API_KEY": "stub",
+        "GOOGLE_API_KEY": "stub",
+        "GEMINI_TRANSPORT": "rest",
+        "GEMINI_API_ENDPOINT": base_url,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--profile", action="append", type=parse_profile, default=[],
+                        help="provider=latency_ms[:error_rate[:rate_limit_rate]], repeatable")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server(dict(args.profile), args.host, args.port)
+    for name, value in app_environment(base_url).items():
+        print(f"export {name}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+# Normalize free text so trivially different inputs share a cache entry
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
+
+# Build a stable cache key from any number of text parts
+def make_key(*parts):
+    normalized = json.dumps([normalize_text(part) for part in parts])
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+    When `path` is given, entries are also written to an SQLite file so they survive restarts;
+    the disk tier is bounded to `max_disk_entries` rows, oldest first out.
+    Values must be JSON-serializable when the disk tier is enabled.
+    """
+
+    def __init__(self, maxsize=1024, ttl=3600, path=None, max_disk_entries=100000):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires REAL, created REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_created ON cache (created)")
+            self._db.commit()
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO cache (key, value, expires, created) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(value), expires, now),
+                    )
+                    self._db.execute("DELETE FROM cache WHERE expires <= ?", (now,))
+                    self._db.execute(
+                        "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,),
+                    )
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.error(f"Error writing cache entry to disk: {e}")
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._db.commit()
+
+    def _remember(self, key, value, expires):
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Wrap a function of text arguments so its results are served from `cache`
+def cached_call(cache, func, namespace=""):
+    def wrapper(*args):
+        key = make_key(namespace, *args)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        result = func(*args)
+        cache.set(key, result)
+        return result
+    return wrapper
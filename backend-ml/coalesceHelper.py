@@ -0,0 +1,28 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller starts the computation,
+    callers arriving while it is in flight await the same result (or exception).
+    The shared task is shielded so one client disconnecting does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, *args):
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._inflight), "calls": self.calls, "coalesced": self.coalesced}
@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Third-party packages loaded on first use rather than when the app is imported, by feature
+DEPENDENCIES = {
+    "langchain": (
+        "langchain_core.callbacks",
+        "langchain_core.prompts",
+        "langchain_core.tools",
+        "langchain.chains",
+        "langchain.agents",
+        "langchain_groq",
+        "langchain_community.utilities",
+        "langchain_community.tools",
+    ),
+    "gemini": ("google.generativeai", "google.api_core.exceptions"),
+    "image": ("PIL.Image",),
+    "speech": ("gtts",),
+}
+
+# Importing these from several threads at once can fail half-way (LangChain and pydantic.v1 have
+# import cycles that are not thread safe), so every group is imported by one thread at a time
+import_lock = threading.Lock()
+loaded = set()
+
+
+def load_dependencies(*groups):
+    """
+    Import the given dependency groups (all of them by default) if not done yet.
+    Call before any lazy import of these packages: while another thread (e.g. the startup
+    warm-up) is importing, this waits for it instead of importing the same modules concurrently.
+    Missing packages are only logged here; the caller's own import raises the real error.
+    """
+    groups = groups or tuple(DEPENDENCIES)
+    if loaded.issuperset(groups):
+        return
+    with import_lock:
+        for group in groups:
+            if group in loaded:
+                continue
+            for name in DEPENDENCIES[group]:
+                try:
+                    importlib.import_module(name)
+                except Exception as e:
+                    logger.warning(f"Could not import {name}: {e}")
+            loaded.add(group)
+
+# For request handlers: waits for the imports in a worker thread instead of on the event loop
+async def load_dependencies_async(*groups):
+    if not loaded.issuperset(groups or tuple(DEPENDENCIES)):
+        await asyncio.to_thread(load_dependencies, *groups)
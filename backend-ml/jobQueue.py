@@ -0,0 +1,85 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    Background worker pool for long-running requests. `submit` returns a job id right away;
+    the job moves through queued -> running -> completed / failed and can be polled with `get`.
+    At most `max_pending` jobs wait for a worker; `submit` raises QueueFull beyond that.
+    Finished jobs are forgotten `ttl` seconds after they complete.
+    """
+
+    def __init__(self, workers=2, ttl=3600, name="job", max_pending=20):
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._pending = 0
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # The job runs in a copy of the caller's context, so it keeps e.g. the request id for tracing
+    def submit(self, fn, *args):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"{self._pending} jobs already waiting")
+            self._pending += 1
+            self._prune(now)
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "created": now,
+                "updated": now,
+                "result": None,
+                "error": None,
+            }
+        self._pool.submit(contextvars.copy_context().run, self._run, job_id, fn, args)
+        return job_id
+
+    def full(self):
+        with self._lock:
+            return self._pending >= self.max_pending
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return counts
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated=time.time())
+
+    def _run(self, job_id, fn, args):
+        with self._lock:
+            self._pending -= 1
+        self._update(job_id, status="running")
+        try:
+            self._update(job_id, status="completed", result=fn(*args))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e))
+
+    def _prune(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in ("completed", "failed") and now - job["updated"] > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,383 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from metricsHelper import Counter, Gauge, Histogram, StatsCollector, track_upstream
+from promptBuilder import count_tokens
+from tracingHelper import span
+from importHelper import load_dependencies
+
+logger = logging.getLogger(__name__)
+
+# Groq quota of the account, per minute (0 = no limit); see console.groq.com/settings/limits
+GROQ_RPM = int(os.getenv('GROQ_RPM', 0))
+GROQ_TPM = int(os.getenv('GROQ_TPM', 0))
+# Maximum number of Groq calls in flight at once from this worker
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 32))
+# Completion tokens assumed when reserving TPM for a call without max_tokens
+GROQ_COMPLETION_ESTIMATE = int(os.getenv('GROQ_COMPLETION_ESTIMATE', 512))
+# Retries of 429 / 5xx / connection errors, with full-jitter exponential backoff
+GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', 4))
+GROQ_RETRY_BASE = float(os.getenv('GROQ_RETRY_BASE', 0.5))
+GROQ_RETRY_MAX = float(os.getenv('GROQ_RETRY_MAX', 20))
+
+# Lower runs first: a tutoring turn waits for nothing but other tutoring turns
+PRIORITIES = {"interactive": 0, "batch": 1, "background": 2}
+
+current_priority = contextvars.ContextVar("llm_priority", default="interactive")
+
+@contextmanager
+def llm_priority(name):
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown LLM priority {name!r}")
+    previous = current_priority.get()
+    current_priority.set(name)
+    try:
+        yield
+    finally:
+        current_priority.set(previous)
+
+# Wrap fn so the LLM calls it makes run at the given priority
+def with_priority(name, fn):
+    def wrapper(*args, **kwargs):
+        with llm_priority(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+queue_depth = Gauge("genai_llm_queue_depth", "LLM calls waiting for the scheduler", ("provider", "priority"))
+queue_wait = Histogram("genai_llm_queue_wait_seconds", "Time LLM calls waited for the scheduler", ("provider", "priority"))
+llm_retries = Counter("genai_llm_retries_total", "LLM calls retried after a rate limit or server error", ("provider", "reason"))
+
+
+class TokenBucket:
+    """Allows `per_minute` units per minute, with bursts up to a minute's worth; 0 disables the limit."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until `amount` units are available (amounts above the capacity wait for a full bucket)
+    def wait_time(self, amount, now):
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    # Return unused units, or charge more when the call used more than reserved
+    def adjust(self, amount):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Waiter:
+    __slots__ = ("cost", "priority", "enqueued", "event", "loop", "future", "admitted", "cancelled")
+
+    def __init__(self, cost, priority, loop=None):
+        self.cost = cost
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+        self.admitted = False
+        self.cancelled = False
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(lambda: self.future.done() or self.future.set_result(None))
+
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying after `error`, or None if it should not be retried."""
+    status = getattr(error, "status_code", None)
+    connection_error = type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    if not (status == 429 or (status is not None and status >= 500) or connection_error):
+        return None
+    delay = random.uniform(0, min(GROQ_RETRY_MAX, GROQ_RETRY_BASE * 2 ** attempt))
+    response = getattr(error, "response", None)
+    try:
+        delay = max(delay, float(response.headers.get("retry-after")))
+    except (AttributeError, TypeError, ValueError):
+        pass
+    return delay
+
+def retry_reason(error):
+    status = getattr(error, "status_code", None)
+    return str(status) if status is not None else type(error).__name__
+
+
+class LLMScheduler:
+    """
+    Central admission control for one LLM provider, shared by threads and coroutines. Calls wait
+    in a priority queue (FIFO within a priority) until a concurrency slot is free and the
+    request and token buckets allow them; the head of the queue is never overtaken, so large
+    prompts are not starved by small ones. Failed calls (429, 5xx, connection errors) are
+    retried with jittered backoff, and a 429 pauses all admissions for its Retry-After.
+    """
+
+    def __init__(self, name, max_concurrency, rpm=0, tpm=0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._queue = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self._timer = None
+        self._timer_due = None
+
+    def _enqueue(self, cost, loop=None):
+        priority = current_priority.get()
+        waiter = Waiter(cost, priority, loop)
+        with self._lock:
+            heapq.heappush(self._queue, (PRIORITIES[priority], next(self._seq), waiter))
+            queue_depth.inc(provider=self.name, priority=priority)
+            self._admit()
+        return waiter
+
+    # Admit waiters from the head of the queue while capacity allows; called with the lock held
+    def _admit(self):
+        now = time.monotonic()
+        while self._queue and self._active < self.max_concurrency:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            wait = max(self._paused_until - now, self._requests.wait_time(1, now), self._tokens.wait_time(waiter.cost, now))
+            if wait > 0:
+                self._wake_after(wait, now)
+                return
+            heapq.heappop(self._queue)
+            self._requests.take(1, now)
+            self._tokens.take(waiter.cost, now)
+            self._active += 1
+            waiter.admitted = True
+            queue_depth.dec(provider=self.name, priority=waiter.priority)
+            queue_wait.observe(now - waiter.enqueued, provider=self.name, priority=waiter.priority)
+            waiter.wake()
+
+    def _wake_after(self, delay, now):
+        if self._timer is not None and self._timer_due <= now + delay:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer_due = now + delay
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            self._admit()
+
+    def acquire(self, cost):
+        waiter = self._enqueue(cost)
+        with span(f"{self.name}.queue", priority=waiter.priority):
+            waiter.event.wait()
+        return waiter
+
+    async def acquire_async(self, cost):
+        waiter = self._enqueue(cost, asyncio.get_running_loop())
+        try:
+            with span(f"{self.name}.queue", priority=waiter.priority):
+                await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.admitted:
+                    self._release(waiter, None)
+                else:
+                    waiter.cancelled = True
+                    queue_depth.dec(provider=self.name, priority=waiter.priority)
+            raise
+        return waiter
+
+    # Free the slot and settle the token reservation against what the call actually used
+    def _release(self, waiter, used_tokens):
+        self._active -= 1
+        if used_tokens is not None:
+            self._tokens.adjust(waiter.cost - used_tokens)
+        self._admit()
+
+    def release(self, waiter, used_tokens=None):
+        with self._lock:
+            self._release(waiter, used_tokens)
+
+    def _backoff(self, error, attempt):
+        delay = retry_delay(error, attempt) if attempt < GROQ_MAX_RETRIES else None
+        if delay is None:
+            return None
+        reason = retry_reason(error)
+        llm_retries.inc(provider=self.name, reason=reason)
+        logger.warning(f"{self.name} call failed ({reason}), retrying in {delay:.1f}s")
+        if getattr(error, "status_code", None) == 429:
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def run(self, call, cost, usage=None):
+        """Run the blocking `call()` once admitted, retrying retryable failures."""
+        for attempt in itertools.count():
+            waiter = self.acquire(cost)
+            used = None
+            try:
+                with track_upstream(self.name, "chat"):
+                    result = call()
+                used = usage(result) if usage else None
+                return result
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(waiter, used)
+            time.sleep(delay)
+
+    async def run_async(self, call, cost, usage=None):
+        """Await `call()` once admitted, retrying retryable failures."""
+        for attempt in itertools.count():
+            waiter = await self.acquire_async(cost)
+            used = None
+            try:
+                with track_upstream(self.name, "chat"):
+                    result = await call()
+                used = usage(result) if usage else None
+                return result
+            except Exception as e:
+                delay = self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(waiter, used)
+            await asyncio.sleep(delay)
+
+    def stream(self, start, cost, usage=None):
+        """Yield from the iterator returned by `start()` once admitted; retried only until the first chunk."""
+        for attempt in itertools.count():
+            waiter = self.acquire(cost)
+            used = None
+            started = False
+            try:
+                with track_upstream(self.name, "chat"):
+                    for chunk in start():
+                        started = True
+                        used = (usage(chunk) if usage else None) or used
+                        yield chunk
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(waiter, used)
+            time.sleep(delay)
+
+    async def astream(self, start, cost, usage=None):
+        """Async counterpart of `stream`."""
+        for attempt in itertools.count():
+            waiter = await self.acquire_async(cost)
+            used = None
+            started = False
+            try:
+                with track_upstream(self.name, "chat"):
+                    async for chunk in start():
+                        started = True
+                        used = (usage(chunk) if usage else None) or used
+                        yield chunk
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                self.release(waiter, used)
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            queued = sum(1 for _, _, waiter in self._queue if not waiter.cancelled)
+            return {
+                "active": self._active,
+                "max_concurrency": self.max_concurrency,
+                "queued": queued,
+                "paused_seconds": max(0.0, self._paused_until - now),
+                "request_wait_seconds": self._requests.wait_time(1, now),
+            }
+
+
+groq_scheduler = LLMScheduler("groq", LLM_MAX_CONCURRENCY, GROQ_RPM, GROQ_TPM)
+
+StatsCollector("genai_llm_scheduler", "LLM scheduler state", "provider", lambda: {"groq": groq_scheduler.stats()})
+
+
+def message_tokens(messages):
+    return sum(count_tokens(m.content if isinstance(m.content, str) else str(m.content)) for m in messages)
+
+def result_tokens(result):
+    usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+    return usage.get("total_tokens") if usage else None
+
+def chunk_tokens(chunk):
+    usage = getattr(chunk.message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else None
+
+
+# ChatGroq whose calls all go through groq_scheduler; built on first use so importing this
+# module does not load LangChain
+@lru_cache(maxsize=None)
+def scheduled_chat_class():
+    load_dependencies("langchain")
+    from langchain_groq import ChatGroq
+
+    class ScheduledChatGroq(ChatGroq):
+        def _cost(self, messages):
+            return message_tokens(messages) + (self.max_tokens or GROQ_COMPLETION_ESTIMATE)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            call = lambda: ChatGroq._generate(self, messages, stop, run_manager, **kwargs)
+            return groq_scheduler.run(call, self._cost(messages), result_tokens)
+
+        async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+            call = lambda: ChatGroq._agenerate(self, messages, stop, run_manager, **kwargs)
+            return await groq_scheduler.run_async(call, self._cost(messages), result_tokens)
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            start = lambda: ChatGroq._stream(self, messages, stop, run_manager, **kwargs)
+            return groq_scheduler.stream(start, self._cost(messages), chunk_tokens)
+
+        async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+            start = lambda: ChatGroq._astream(self, messages, stop, run_manager, **kwargs)
+            async for chunk in groq_scheduler.astream(start, self._cost(messages), chunk_tokens):
+                yield chunk
+
+    return ScheduledChatGroq
+
+# Drop-in for ChatGroq(...); the SDK's own retries are disabled since the scheduler retries
+def scheduled_chat_groq(**kwargs):
+    return scheduled_chat_class()(max_retries=0, **kwargs)
@@ -1,29 +1,45 @@
 from fastapi import FastAPI, HTTPException, Query, Body, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import List, Dict, Union
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from langchain_community.utilities import GoogleSerperAPIWrapper, WikipediaAPIWrapper
-from langchain_community.tools import YouTubeSearchTool
-from langchain.tools import WikipediaQueryRun
-from langchain.agents import initialize_agent, Tool
-from langchain.chains import LLMChain
+from starlette.concurrency import iterate_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import List, Dict, Union, Optional
 from dotenv import load_dotenv
 import os
 import logging
 import tempfile
-from GenMCQ import generate_mcqs_with_llm, generate_mcqs_with_google_search, generate_report
-from Resources import searchResources
+import asyncio
+import json
+from functools import lru_cache
+import itertools
+from GenMCQ import MAX_NOQ, generate_mcqs_chunked, generate_mcqs_with_google_search, generate_report, stream_mcqs_with_llm, dedupe_mcqs
+from Resources import searchResources_async, resource_cache
 from fastapi.responses import FileResponse, JSONResponse
-from multimodelHelper import llm_model_audio, llm_model_image, llm_model_video, text_to_speech
+from sessionHelper import SessionStore
+from cacheHelper import TTLCache, make_key, cached_call
+from mcqBank import MCQBank, refill_loop
+from coalesceHelper import SingleFlight
+from agentPool import AgentPool
+from jobQueue import JobQueue, QueueFull
+from metricsHelper import MetricsMiddleware, StatsCollector, render_metrics, instrumented, track_stage, llm_metrics_callback
+from tracingHelper import TracingMiddleware, span
+from promptBuilder import count_tokens, fit_history
+from llmScheduler import scheduled_chat_groq, llm_priority, with_priority
+from importHelper import load_dependencies, load_dependencies_async
+from uploadHelper import UploadLimitMiddleware, save_upload, temp_upload, upload_suffix, remove_file, cleanup_stale_uploads, MAX_IMAGE_UPLOAD_BYTES, MAX_VIDEO_UPLOAD_BYTES
+from multimodelHelper import llm_model_image_async, llm_model_video, warm_gemini, text_to_speech, audio_path, touch_audio, register_speech, registered_speech, stream_speech
 import uvicorn
 
 # Initialize FastAPI app
 app = FastAPI()
 load_dotenv()
 
+# Refuse oversized uploads before their multipart body is read (inside CORS, so 413s carry its headers)
+app.add_middleware(UploadLimitMiddleware, limits={
+    "/image-query": MAX_IMAGE_UPLOAD_BYTES,
+    "/video-query": MAX_VIDEO_UPLOAD_BYTES,
+})
+
 # Update CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -42,8 +58,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
+# Per-route latency and in-flight requests, exposed with everything else on /metrics
+app.add_middleware(MetricsMiddleware)
+# Request ids (X-Request-ID) and sampled traces of each request's stages (TRACE_* settings)
+app.add_middleware(TracingMiddleware)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -53,11 +75,14 @@ SERPER_API_KEY = os.getenv('SERPER_API_KEY')
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
-# Initialize tools and models
-chat = ChatGroq(temperature=0.5, groq_api_key=GROQ_API_KEY, model_name="mixtral-8x7b-32768")
-serper = GoogleSerperAPIWrapper(serper_api_key=SERPER_API_KEY)
-wikipedia = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
-youtube = YouTubeSearchTool()
+# Build agents and Gemini clients in the background right after startup (set to 0 to load on first use only)
+PREWARM_ON_STARTUP = os.getenv('PREWARM_ON_STARTUP', '1') == '1'
+
+# Initialize models on first use, so new workers accept traffic without loading LangChain/Groq up front.
+# Calls are queued by priority and rate limited by the shared Groq scheduler (see llmScheduler).
+@lru_cache(maxsize=None)
+def get_chat():
+    return scheduled_chat_groq(temperature=0.5, groq_api_key=GROQ_API_KEY, model_name="mixtral-8x7b-32768", callbacks=[llm_metrics_callback("groq")])
 
 # Define system prompt
 system = """
@@ -67,42 +92,208 @@ Your role is not to give direct answers but to ask thoughtful, probing questions
 """
 
 # Define conversation history format
-def format_conversation_history(history):
-    return "\n".join([f"Student: {entry['student']}\nSocratic Assistant: {entry['assistant']}" for entry in history])
-
-# Function to generate a Socratic response considering the conversation history
-def socratic_conversation(student_query, history):
-    history_text = format_conversation_history(history)
-    human = f"""
-    {history_text}
+def format_turn(entry):
+    return f"Student: {entry['student']}\nSocratic Assistant: {entry['assistant']}"
+
+# Token budget for a whole Socratic prompt; the history gets what the system prompt, summary and
+# query leave, most recent turns first. PROMPT_PIN_FIRST_TURN=1 also keeps the opening turn.
+PROMPT_MAX_TOKENS = int(os.getenv('PROMPT_MAX_TOKENS', 3000))
+PROMPT_PIN_FIRST_TURN = os.getenv('PROMPT_PIN_FIRST_TURN', '0') == '1'
+# Allowance for the instructions around the history in the human message
+PROMPT_TEMPLATE_TOKENS = 80
+
+def budgeted_history(student_query, history, summary=""):
+    reserved = count_tokens(system) + count_tokens(summary) + count_tokens(student_query) + PROMPT_TEMPLATE_TOKENS
+    history_text, _ = fit_history(history, max(0, PROMPT_MAX_TOKENS - reserved), format_turn, PROMPT_PIN_FIRST_TURN)
+    return history_text
+
+# Build the Socratic prompt for a student query and its conversation history; the history is
+# bound as a template value (and the query passed at call time), so braces in them are kept as is
+def build_socratic_prompt(student_query, history, summary=""):
+    history_text = budgeted_history(student_query, history, summary)
+    if summary:
+        history_text = f"Summary of the earlier conversation: {summary}\n{history_text}"
+    human = """
+    {history}
 
     Student: {student_query}
 
     Respond to the student's query by asking a one relevant question that leads them to the solution.
     If the students response is absolutely correct ,appreciate him and dont ask him further questions.
     """
-    prompt = ChatPromptTemplate.from_messages([("system", system), ("human", human)])
-    chain = LLMChain(prompt=prompt, llm=chat)
-    return chain.run({"student_query": student_query})
+    load_dependencies("langchain")
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([("system", system), ("human", human)]).partial(history=history_text)
+
+# Cache of Socratic replies keyed on the normalized system prompt, history and query
+response_cache = TTLCache(
+    maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('RESPONSE_CACHE_TTL', 86400)),
+    path=os.getenv('RESPONSE_CACHE_PATH'),
+)
+
+def socratic_cache_key(student_query, history, summary=""):
+    return make_key(system, summary, budgeted_history(student_query, history, summary), student_query)
+
+# Generate a Socratic response considering the conversation history, without blocking the event loop on Groq
+async def socratic_conversation_async(student_query, history, summary=""):
+    key = socratic_cache_key(student_query, history, summary)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    await load_dependencies_async("langchain")
+    prompt = build_socratic_prompt(student_query, history, summary)
+    from langchain.chains import LLMChain
+    chain = LLMChain(prompt=prompt, llm=get_chat())
+    with span("socratic.llm"):
+        response = await chain.arun({"student_query": student_query})
+    response_cache.set(key, response)
+    return response
+
+# Stream the Socratic response token by token
+async def socratic_conversation_stream(student_query, history):
+    key = socratic_cache_key(student_query, history)
+    cached = response_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    await load_dependencies_async("langchain")
+    prompt = build_socratic_prompt(student_query, history)
+    chain = prompt | get_chat()
+    tokens = []
+    async for chunk in chain.astream({"student_query": student_query}):
+        if chunk.content:
+            tokens.append(chunk.content)
+            yield chunk.content
+    response_cache.set(key, "".join(tokens))
+
+# Prompt used to fold older session turns into the running summary
+summary_system = """
+You maintain a running summary of a tutoring conversation between a student and a Socratic assistant about Data Structures and Algorithms.
+Merge the new turns into the existing summary. Keep the topics covered, what the student has understood, their misconceptions and any open question.
+Reply with the updated summary only, in at most 150 words.
+"""
+
+async def summarize_turns(summary, turns):
+    # Turns pile up if summaries keep failing, so they get the same budget as the Socratic prompt
+    turns_text, _ = fit_history(turns, max(0, PROMPT_MAX_TOKENS - count_tokens(summary_system) - count_tokens(summary)), format_turn)
+    human = """
+    Existing summary: {summary}
+
+    New turns:
+    {turns}
+    """
+    await load_dependencies_async("langchain")
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain.chains import LLMChain
+    prompt = ChatPromptTemplate.from_messages([("system", summary_system), ("human", human)])
+    chain = LLMChain(prompt=prompt, llm=get_chat())
+    # Nobody is waiting on the summary, so it yields to tutoring turns and batch generation
+    with span("session.summarize", turns=len(turns)), llm_priority("background"):
+        return await chain.arun({"summary": summary or "None", "turns": turns_text})
+
+# Server-side conversation sessions, so clients only send the new turn
+sessions = SessionStore(
+    summarize_turns,
+    recent_turns=int(os.getenv('SESSION_RECENT_TURNS', 6)),
+    ttl=int(os.getenv('SESSION_TTL', 3600)),
+    max_sessions=int(os.getenv('SESSION_MAX', 10000)),
+)
 
-# Define tools
-tools = [
-    Tool(name="Google Search", func=serper.run, description="Useful for searching the web..."),
-    Tool(name="YouTube Search", func=youtube.run, description="Useful for searching YouTube..."),
-    Tool(name="Wikipedia Search", func=wikipedia.run, description="Useful for Wikipedia searches...")
-]
+# Format a Server-Sent Event
+def sse_event(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+# Result caches for the agent tools, so repeated lookups across agent steps and users stay local
+TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', 512))
+tool_caches = {
+    "Google Search": TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=int(os.getenv('SERPER_CACHE_TTL', 3600))),
+    "YouTube Search": TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=int(os.getenv('YOUTUBE_CACHE_TTL', 86400))),
+    "Wikipedia Search": TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=int(os.getenv('WIKIPEDIA_CACHE_TTL', 604800))),
+}
+
+# Define tools, built on first use like the model
+@lru_cache(maxsize=None)
+def get_tools():
+    load_dependencies("langchain")
+    from langchain_core.tools import Tool
+    from langchain_community.utilities import GoogleSerperAPIWrapper, WikipediaAPIWrapper
+    from langchain_community.tools import YouTubeSearchTool, WikipediaQueryRun
+    serper = GoogleSerperAPIWrapper(serper_api_key=SERPER_API_KEY)
+    wikipedia = WikipediaQueryRun(api_wrapper=WikipediaAPIWrapper())
+    youtube = YouTubeSearchTool()
+    return [
+        Tool(name="Google Search", func=cached_call(tool_caches["Google Search"], instrumented("serper", "agent_search", serper.run)), description="Useful for searching the web..."),
+        Tool(name="YouTube Search", func=cached_call(tool_caches["YouTube Search"], instrumented("youtube", "agent_search", youtube.run)), description="Useful for searching YouTube..."),
+        Tool(name="Wikipedia Search", func=cached_call(tool_caches["Wikipedia Search"], instrumented("wikipedia", "agent_search", wikipedia.run)), description="Useful for Wikipedia searches...")
+    ]
 
 # Initialize the agent
 def initialize_custom_agent():
+    load_dependencies("langchain")
+    from langchain.agents import initialize_agent
     agent = initialize_agent(
-        tools=tools,
-        llm=chat,
+        tools=get_tools(),
+        llm=get_chat(),
         agent_type="chat-conversational-react",
         verbose=False,
         handle_parsing_errors=True
     )
     return agent
 
+# Pre-built agents shared across /search requests
+agent_pool = AgentPool(
+    initialize_custom_agent,
+    size=int(os.getenv('AGENT_POOL_SIZE', 4)),
+    timeout=float(os.getenv('AGENT_POOL_TIMEOUT', 60)),
+)
+
+# Imports first, serially in one thread, then the agents and Gemini clients built on them
+async def warm_up():
+    await asyncio.to_thread(load_dependencies)
+    await asyncio.gather(agent_pool.warm(), asyncio.to_thread(warm_gemini))
+
+@app.on_event("startup")
+async def start_warm_up():
+    # Warm in the background so the worker accepts traffic before the imports finish;
+    # requests arriving meanwhile wait for them in load_dependencies
+    if PREWARM_ON_STARTUP:
+        app.state.warmup = asyncio.create_task(warm_up())
+
+# Persistent MCQ bank, topped up in the background for the seed topics and the (topic, level)
+# pairs requested recently: at most MCQ_BANK_MAX_TOPICS requested in the last MCQ_BANK_ACTIVE_WINDOW
+# seconds. Topics nobody asked for in MCQ_BANK_RETENTION seconds are dropped with their stock.
+mcq_bank = MCQBank(
+    os.getenv('MCQ_BANK_PATH', 'mcq_bank.db'),
+    threshold=int(os.getenv('MCQ_BANK_THRESHOLD', 20)),
+    target=int(os.getenv('MCQ_BANK_TARGET', 50)),
+    active_window=int(os.getenv('MCQ_BANK_ACTIVE_WINDOW', 86400)),
+    max_topics=int(os.getenv('MCQ_BANK_MAX_TOPICS', 100)),
+    retention=int(os.getenv('MCQ_BANK_RETENTION', 30 * 86400)),
+)
+mcq_bank_wake = asyncio.Event()
+
+# Comma-separated topics to stock before anyone asks for them, e.g. "stack,queue,binary search"
+mcq_bank.set_seed_topics([
+    (seed_topic, seed_level)
+    for seed_topic in filter(None, map(str.strip, os.getenv('MCQ_BANK_SEED_TOPICS', '').split(',')))
+    for seed_level in ("easy", "medium", "hard")
+])
+
+@app.on_event("startup")
+async def start_mcq_bank_refiller():
+    app.state.mcq_bank_refiller = asyncio.create_task(refill_loop(
+        mcq_bank,
+        with_priority("background", generate_mcqs_chunked),
+        mcq_bank_wake,
+        interval=int(os.getenv('MCQ_BANK_REFILL_INTERVAL', 60)),
+        batch_size=int(os.getenv('MCQ_BANK_REFILL_BATCH', 10)),
+    ))
+
+# Coalesces identical in-flight /generate-mcqs and /resources requests
+inflight = SingleFlight()
+
 # Define API Models
 class QueryModel(BaseModel):
     query: str
@@ -112,14 +303,36 @@ class ResponseModel(BaseModel):
     response: str
     history: List[Dict[str, str]]
 
+class SessionQueryModel(BaseModel):
+    query: str
+    session_id: Optional[str] = None
+
+class SessionResponseModel(BaseModel):
+    session_id: str
+    response: str
+
 class MCQRequest(BaseModel):
     topic: str
-    noq: int
+    noq: int = Field(gt=0, le=MAX_NOQ)
     level: str
 
 class MCQResponse(BaseModel):
     mcqs: List[Dict[str, Union[str, List[str], int]]]
 
+class MCQBatchRequest(BaseModel):
+    requests: List[MCQRequest]
+
+class MCQBatchResult(BaseModel):
+    index: int
+    topic: str
+    noq: int
+    level: str
+    mcqs: List[Dict[str, Union[str, List[str], int]]]
+    error: Optional[str] = None
+
+class MCQBatchResponse(BaseModel):
+    results: List[MCQBatchResult]
+
 class SearchQuery(BaseModel):
     query: str
 
@@ -133,13 +346,92 @@ async def options_query():
 async def query_agent_endpoint(data: QueryModel):
     # logger.info(f"Received query: {data.query}")
     # logger.info(f"Received history: {data.history}")
-    agent = initialize_custom_agent()
     history = [{"student": item["student"], "assistant": item["assistant"]} 
                for item in data.history if item["student"] or item["assistant"]]
-    response = socratic_conversation(data.query, history)
+    response = await socratic_conversation_async(data.query, history)
     history.append({"student": data.query, "assistant": response})
     return {"response": response, "history": history}
 
+# Add an OPTIONS endpoint for /query/stream
+@app.options("/query/stream")
+async def options_query_stream():
+    return {"message": "OK"}
+
+# Streaming variant of /query: tokens are sent as Server-Sent Events as they arrive,
+# the final "done" event carries the response and updated history like ResponseModel
+@app.post("/query/stream")
+async def query_stream_endpoint(data: QueryModel):
+    history = [{"student": item["student"], "assistant": item["assistant"]}
+               for item in data.history if item["student"] or item["assistant"]]
+
+    async def event_stream():
+        tokens = []
+        try:
+            async for token in socratic_conversation_stream(data.query, history):
+                tokens.append(token)
+                yield sse_event({"token": token})
+        except Exception as e:
+            logger.error(f"Error while streaming Socratic response: {e}")
+            yield sse_event({"detail": str(e)}, event="error")
+            return
+        response = "".join(tokens)
+        history.append({"student": data.query, "assistant": response})
+        yield sse_event({"response": response, "history": history}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# Add an OPTIONS endpoint for /session-query
+@app.options("/session-query")
+async def options_session_query():
+    return {"message": "OK"}
+
+# Session-based variant of /query: the history is kept server-side under session_id.
+# Omit session_id (or send an expired one) to start a new session.
+@app.post("/session-query", response_model=SessionResponseModel)
+async def session_query_endpoint(data: SessionQueryModel):
+    session = sessions.get_or_create(data.session_id)
+    async with session.lock:
+        response = await socratic_conversation_async(data.query, session.history(), session.summary)
+        sessions.record_turn(session, data.query, response)
+    return {"session_id": session.session_id, "response": response}
+
+@app.delete("/session/{session_id}")
+async def delete_session_endpoint(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session deleted"}
+
+# Hit/miss counters for the response cache
+@app.get("/cache-stats")
+async def cache_stats_endpoint():
+    return {
+        "response_cache": response_cache.stats(),
+        "resource_cache": resource_cache.stats(),
+        "inflight": inflight.stats(),
+        "tools": {name: cache.stats() for name, cache in tool_caches.items()},
+    }
+
+# Cache, pool and job queue statistics, read when /metrics is scraped
+StatsCollector("genai_cache", "Cache statistics", "cache", lambda: {
+    "response": response_cache.stats(),
+    "resources": resource_cache.stats(),
+    **{f"tool:{name}": cache.stats() for name, cache in tool_caches.items()},
+})
+StatsCollector("genai_component", "Worker component statistics", "component", lambda: {
+    "agent_pool": agent_pool.stats(),
+    "singleflight": inflight.stats(),
+    "video_jobs": video_jobs.stats(),
+})
+
+# Prometheus metrics: request latency, upstream latency and errors per provider, LLM tokens, caches
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Add an OPTIONS endpoint for /search
 @app.options("/search")
 async def options_search():
@@ -149,8 +441,12 @@ async def options_search():
 async def search_endpoint(data: QueryModel):
     # logger.info(f"Received search query: {data.query}")
     query = data.query
-    agent = initialize_custom_agent()
-    response = agent.run(query)
+    try:
+        async with agent_pool.acquire() as agent:
+            with span("agent.run"):
+                response = await agent.arun(query)
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="All agents are busy, please try again")
     return {"response": response}
 
 # Add an OPTIONS endpoint for /generate-mcqs
@@ -158,14 +454,32 @@ async def search_endpoint(data: QueryModel):
 async def options_generate_mcqs():
     return {"message": "OK"}
 
+# Bank first, then live generation, then Google Search as a last resort
+async def produce_mcqs(topic, noq, level):
+    # Serve from the pre-generated bank first, generate live only what is missing
+    mcq_bank.track(topic, level)
+    with track_stage("mcq_bank_take"):
+        mcqs = dedupe_mcqs(mcq_bank.take(topic, level, noq))
+    if len(mcqs) < noq:
+        # Live questions must not repeat the ones already taken from the bank.
+        # Quiz generation is a long, many-call job: it yields Groq capacity to tutoring turns
+        taken = [mcq["question"] for mcq in mcqs]
+        with track_stage("mcq_live_generation"), llm_priority("batch"):
+            mcqs += await asyncio.to_thread(generate_mcqs_chunked, topic, noq - len(mcqs), level, exclude=taken)
+    if not mcqs:
+        logger.info("Falling back to Google Search for generating MCQs...")
+        with track_stage("mcq_search_fallback"):
+            mcqs = await asyncio.to_thread(generate_mcqs_with_google_search, topic, noq)
+    mcq_bank_wake.set()
+    return mcqs
+
 @app.post("/generate-mcqs", response_model=MCQResponse)
 async def generate_mcqs_endpoint(data: MCQRequest):
     logger.info(f"Received MCQ generation request: Topic: {data.topic}, NoQ: {data.noq}, Level: {data.level}")
     
-    mcqs = generate_mcqs_with_llm(data.topic, data.noq, data.level)
-    if not mcqs:
-        logger.info("Falling back to Google Search for generating MCQs...")
-        mcqs = generate_mcqs_with_google_search(data.topic, data.noq)
+    # Identical requests arriving together (e.g. a whole class starting a quiz) share one generation
+    key = make_key("mcqs", data.topic, data.noq, data.level)
+    mcqs = await inflight.do(key, produce_mcqs, data.topic, data.noq, data.level)
     
     if not mcqs:
         raise HTTPException(status_code=404, detail="Unable to generate MCQs")
@@ -174,6 +488,116 @@ async def generate_mcqs_endpoint(data: MCQRequest):
     return {"mcqs": mcqs}
 
 
+# Add an OPTIONS endpoint for /generate-mcqs/stream
+@app.options("/generate-mcqs/stream")
+async def options_generate_mcqs_stream():
+    return {"message": "OK"}
+
+# Streaming variant of /generate-mcqs: one MCQ per NDJSON line, sent as soon as it is available
+@app.post("/generate-mcqs/stream")
+async def generate_mcqs_stream_endpoint(data: MCQRequest):
+    logger.info(f"Received MCQ streaming request: Topic: {data.topic}, NoQ: {data.noq}, Level: {data.level}")
+    mcq_bank.track(data.topic, data.level)
+
+    async def mcq_lines():
+        seen = set()
+        sent = 0
+        taken = []
+        for mcq in dedupe_mcqs(mcq_bank.take(data.topic, data.level, data.noq), seen):
+            sent += 1
+            taken.append(mcq["question"])
+            yield json.dumps(mcq) + "\n"
+        if sent < data.noq:
+            # The model is told which questions were already sent from the bank
+            llm_mcqs = stream_mcqs_with_llm(data.topic, data.noq - sent, data.level, exclude=taken)
+            try:
+                # Same priority as /generate-mcqs; the worker threads inherit it with the context
+                with llm_priority("batch"):
+                    async for mcq in iterate_in_threadpool(llm_mcqs):
+                        if dedupe_mcqs([mcq], seen):
+                            sent += 1
+                            yield json.dumps(mcq) + "\n"
+                        if sent >= data.noq:
+                            break
+            finally:
+                # Close the Groq stream now rather than whenever the generator is collected
+                await asyncio.to_thread(llm_mcqs.close)
+        if not sent:
+            logger.info("Falling back to Google Search for generating MCQs...")
+            for mcq in await asyncio.to_thread(generate_mcqs_with_google_search, data.topic, data.noq):
+                sent += 1
+                yield json.dumps(mcq) + "\n"
+        mcq_bank_wake.set()
+        if not sent:
+            yield json.dumps({"error": "Unable to generate MCQs"}) + "\n"
+
+    return StreamingResponse(mcq_lines(), media_type="application/x-ndjson")
+
+
+# Topics generated at once across all batch requests of this worker, and the largest batch accepted
+MCQ_BATCH_CONCURRENCY = int(os.getenv('MCQ_BATCH_CONCURRENCY', 4))
+MCQ_BATCH_MAX_TOPICS = int(os.getenv('MCQ_BATCH_MAX_TOPICS', 50))
+mcq_batch_semaphore = asyncio.Semaphore(MCQ_BATCH_CONCURRENCY)
+
+def check_batch_size(data):
+    if not data.requests:
+        raise HTTPException(status_code=400, detail="No topics requested")
+    if len(data.requests) > MCQ_BATCH_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"At most {MCQ_BATCH_MAX_TOPICS} topics per batch")
+
+# One topic of a batch: same path as /generate-mcqs, a failure is reported instead of raised
+async def batch_mcq_result(index, spec):
+    error = None
+    async with mcq_batch_semaphore:
+        try:
+            with span("mcq.batch_topic", topic=spec.topic, noq=spec.noq), llm_priority("batch"):
+                key = make_key("mcqs", spec.topic, spec.noq, spec.level)
+                mcqs = await inflight.do(key, produce_mcqs, spec.topic, spec.noq, spec.level)
+        except Exception as e:
+            logger.error(f"Batch MCQ generation failed for {spec.topic}: {e}")
+            mcqs, error = [], str(e)
+    if not mcqs and error is None:
+        error = "Unable to generate MCQs"
+    return {"index": index, "topic": spec.topic, "noq": spec.noq, "level": spec.level, "mcqs": mcqs, "error": error}
+
+# Add an OPTIONS endpoint for /generate-mcqs/batch
+@app.options("/generate-mcqs/batch")
+async def options_generate_mcqs_batch():
+    return {"message": "OK"}
+
+# MCQs for several (topic, noq, level) specs at once, results in request order
+@app.post("/generate-mcqs/batch", response_model=MCQBatchResponse)
+async def generate_mcqs_batch_endpoint(data: MCQBatchRequest):
+    check_batch_size(data)
+    logger.info(f"Received batch MCQ generation request for {len(data.requests)} topics")
+    results = await asyncio.gather(*(batch_mcq_result(i, spec) for i, spec in enumerate(data.requests)))
+    return {"results": results}
+
+# Add an OPTIONS endpoint for /generate-mcqs/batch/stream
+@app.options("/generate-mcqs/batch/stream")
+async def options_generate_mcqs_batch_stream():
+    return {"message": "OK"}
+
+# Streaming variant of /generate-mcqs/batch: one NDJSON line per topic, in the order they finish;
+# "index" refers to the position of the spec in the request
+@app.post("/generate-mcqs/batch/stream")
+async def generate_mcqs_batch_stream_endpoint(data: MCQBatchRequest):
+    check_batch_size(data)
+    logger.info(f"Received batch MCQ streaming request for {len(data.requests)} topics")
+
+    async def result_lines():
+        tasks = [asyncio.create_task(batch_mcq_result(i, spec)) for i, spec in enumerate(data.requests)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Client went away: stop topics that have not started yet
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
 # @app.post("/resources/")
 # async def search(search_query: SearchQuery):
 #     print(f"Received search query: {search_query.query}")
@@ -185,7 +609,7 @@ async def search_query(payload: SearchQuery):
     try:
         query = payload.query
         print(f"Received search query: {query}")
-        results = searchResources(query)
+        results = await inflight.do(make_key("resources", query), searchResources_async, query)
         return results
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -232,20 +656,15 @@ async def image_query(
     query_text: str = Form(...)
 ):
     print(f"Received image query: {query_text}")
-    # Save the uploaded image
-    image_path = f"temp_image.{image.filename.split('.')[-1]}"
-    print(image_path)
-    with open(image_path, "wb") as f:
-        f.write(await image.read())
-
-    # Use the helper function to process the image + text query
-    response = llm_model_image(query_text, image_path)
-    print(f"Response: {response}")
+    # Stream the uploaded image to a temp file that is removed once the query is answered
+    async with temp_upload(image, upload_suffix(image.filename, ".jpg"), MAX_IMAGE_UPLOAD_BYTES) as image_path:
+        # Use the helper function to process the image + text query
+        response = await llm_model_image_async(query_text, image_path)
     
-    # Convert response to speech and return it
-    text_to_speech(response)
+    # Speech is synthesized on demand by /stream-audio or /download-audio
+    audio_id = register_speech(response)
     return JSONResponse(
-        content={"text_response": response},
+        content={"text_response": response, "audio_id": audio_id},
         status_code=200,
         headers={
             "Access-Control-Allow-Origin": "*",
@@ -254,25 +673,63 @@ async def image_query(
         }
     )
 
+@app.on_event("startup")
+async def remove_stale_uploads():
+    app.state.upload_cleanup = asyncio.create_task(asyncio.to_thread(cleanup_stale_uploads))
+
 # Video + Text + Voice Query Endpoint
+# Background workers for video queries: upload, processing and generation can take minutes
+video_jobs = JobQueue(
+    workers=int(os.getenv('VIDEO_JOB_WORKERS', 2)),
+    ttl=int(os.getenv('VIDEO_JOB_TTL', 3600)),
+    name="video-job",
+    max_pending=int(os.getenv('VIDEO_JOB_MAX_PENDING', 20)),
+)
+
+def video_queue_full_response():
+    return JSONResponse(
+        content={"error": "Too many video queries in progress, please try again later"},
+        status_code=503,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+            "Retry-After": "60",
+        }
+    )
+
+def process_video_query(query_text, video_path, content_hash):
+    try:
+        # Use the helper function to process the video + text query
+        with span("video.job"):
+            response = llm_model_video(query_text, video_path, content_hash)
+        # Speech is synthesized on demand by /stream-audio or /download-audio
+        audio_id = register_speech(response)
+        return {"text_response": response, "audio_id": audio_id}
+    finally:
+        remove_file(video_path)
+
 @app.post("/video-query")
 async def video_query(
     video: UploadFile = File(...),
     query_text: str = Form(...)
 ):
-    # Save the uploaded video
-    video_path = "temp_video.mp4"
-    with open(video_path, "wb") as f:
-        f.write(await video.read())
+    # Each waiting job keeps its upload on disk, so refuse new ones while the queue is full
+    if video_jobs.full():
+        return video_queue_full_response()
 
-    # Use the helper function to process the video + text query
-    response = llm_model_video(query_text, video_path)
-    
-    # Convert response to speech and return it
-    text_to_speech(response)
+    # Stream the uploaded video to a temp file, removed by the job once it finishes
+    video_path, content_hash = await save_upload(video, upload_suffix(video.filename, ".mp4"), MAX_VIDEO_UPLOAD_BYTES)
+
+    # Process in the background and let the client poll /video-query/{job_id}
+    try:
+        job_id = video_jobs.submit(process_video_query, query_text, video_path, content_hash)
+    except QueueFull:
+        remove_file(video_path)
+        return video_queue_full_response()
     return JSONResponse(
-        content={"text_response": response},
-        status_code=200,
+        content={"job_id": job_id, "status": "queued"},
+        status_code=202,
         headers={
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "POST, OPTIONS",
@@ -280,15 +737,42 @@ async def video_query(
         }
     )
 
-# Endpoint to download the generated speech file
+# Status and result of a video query job
+@app.get("/video-query/{job_id}")
+async def video_query_status(job_id: str):
+    job = video_jobs.get(job_id)
+    if job is None:
+        return JSONResponse(
+            content={"error": "Job not found"},
+            status_code=404,
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type",
+            }
+        )
+    return JSONResponse(
+        content=job,
+        status_code=200,
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+        }
+    )
+
+# Endpoint to download a generated speech file by the audio_id returned with the text response
 @app.get("/download-audio")
-def download_audio():
-    audio_file_path = "speech.mp3"
+def download_audio(audio_id: str = Query(..., pattern="^[0-9a-f]{32}$")):
+    audio_file_path = audio_path(audio_id)
+    speech = registered_speech(audio_id)
+    if not touch_audio(audio_file_path) and speech is not None:
+        text_to_speech(*speech)
     if os.path.exists(audio_file_path):
         return FileResponse(
             path=audio_file_path,
             media_type='audio/mp3',
-            filename="speech.mp3",
+            filename=f"{audio_id}.mp3",
             headers={
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "GET, OPTIONS",
@@ -305,10 +789,53 @@ def download_audio():
         }
     )
 
+# Endpoint streaming the speech progressively, playable as soon as the first sentence is synthesized
+@app.get("/stream-audio")
+def stream_audio(audio_id: str = Query(..., pattern="^[0-9a-f]{32}$")):
+    speech = registered_speech(audio_id)
+    if speech is None and os.path.exists(audio_path(audio_id)):
+        return download_audio(audio_id)
+    if speech is None:
+        return JSONResponse(
+            content={"error": "Audio file not found"},
+            status_code=404,
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type",
+            }
+        )
+    # Synthesize the first chunk before answering, so a failing TTS call is a 502 instead of an empty 200
+    audio = stream_speech(*speech)
+    try:
+        first = next(audio, b"")
+    except Exception as e:
+        logger.error(f"Speech synthesis failed for {audio_id}: {e}")
+        return JSONResponse(
+            content={"error": "Speech synthesis failed"},
+            status_code=502,
+            headers={
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "GET, OPTIONS",
+                "Access-Control-Allow-Headers": "Content-Type",
+            }
+        )
+    return StreamingResponse(
+        itertools.chain([first], audio),
+        media_type='audio/mpeg',
+        headers={
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+        }
+    )
+
 # Add OPTIONS handlers for the multimodal endpoints
 @app.options("/image-query")
 @app.options("/video-query")
+@app.options("/video-query/{job_id}")
 @app.options("/download-audio")
+@app.options("/stream-audio")
 async def options_handler():
     return JSONResponse(
         content={"message": "OK"},
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict
+
+from cacheHelper import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class MCQBank:
+    """
+    Persistent stock of pre-generated MCQs indexed by (topic, level).
+    Served questions are removed from the bank; topics that have been requested are tracked
+    so the refiller can top them up once their stock falls below `threshold`. Only the hot set
+    is refilled: seed topics plus at most `max_topics` topics requested in the last
+    `active_window` seconds. Topics not requested for `retention` seconds are dropped with
+    their questions.
+    """
+
+    def __init__(self, path, threshold=20, target=50, active_window=86400, max_topics=100, retention=30 * 86400):
+        self.threshold = threshold
+        self.target = target
+        self.active_window = active_window
+        self.max_topics = max_topics
+        self.retention = retention
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS mcqs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic TEXT NOT NULL,
+                level TEXT NOT NULL,
+                question TEXT NOT NULL,
+                options TEXT NOT NULL,
+                correct INTEGER NOT NULL,
+                created REAL NOT NULL,
+                UNIQUE (topic, level, question)
+            );
+            CREATE INDEX IF NOT EXISTS mcqs_topic_level ON mcqs (topic, level);
+            CREATE TABLE IF NOT EXISTS topics (
+                topic TEXT NOT NULL,
+                level TEXT NOT NULL,
+                last_requested REAL NOT NULL,
+                seed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (topic, level)
+            );
+        """)
+        # Banks created before seed topics were flagged
+        if "seed" not in [row[1] for row in self._db.execute("PRAGMA table_info(topics)")]:
+            self._db.execute("ALTER TABLE topics ADD COLUMN seed INTEGER NOT NULL DEFAULT 0")
+        self._db.commit()
+
+    def add(self, topic: str, level: str, mcqs: List[Dict]) -> int:
+        topic, level = normalize_text(topic), normalize_text(level)
+        now = time.time()
+        rows = [(topic, level, mcq["question"], json.dumps(mcq["options"]), mcq["correct"], now)
+                for mcq in mcqs if len(mcq.get("options", [])) == 4]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO mcqs (topic, level, question, options, correct, created) VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def take(self, topic: str, level: str, n: int) -> List[Dict]:
+        # SQLite reads a negative LIMIT as no limit, which would empty the whole topic
+        if n <= 0:
+            return []
+        topic, level = normalize_text(topic), normalize_text(level)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, question, options, correct FROM mcqs WHERE topic = ? AND level = ? ORDER BY id LIMIT ?",
+                (topic, level, n),
+            ).fetchall()
+            self._db.executemany("DELETE FROM mcqs WHERE id = ?", [(row[0],) for row in rows])
+            self._db.commit()
+        return [{"question": row[1], "options": json.loads(row[2]), "correct": row[3]} for row in rows]
+
+    def count(self, topic: str, level: str) -> int:
+        topic, level = normalize_text(topic), normalize_text(level)
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM mcqs WHERE topic = ? AND level = ?", (topic, level)
+            ).fetchone()[0]
+
+    def track(self, topic: str, level: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO topics (topic, level, last_requested) VALUES (?, ?, ?) "
+                "ON CONFLICT (topic, level) DO UPDATE SET last_requested = excluded.last_requested",
+                (normalize_text(topic), normalize_text(level), time.time()),
+            )
+            self._db.commit()
+
+    def set_seed_topics(self, pairs):
+        """Replace the seed (topic, level) pairs, which are kept stocked whether requested or not."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE topics SET seed = 0")
+            self._db.executemany(
+                "INSERT INTO topics (topic, level, last_requested, seed) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (topic, level) DO UPDATE SET seed = 1",
+                [(normalize_text(topic), normalize_text(level), now) for topic, level in pairs],
+            )
+            self._db.commit()
+
+    def prune(self) -> int:
+        """Drop topics not requested within `retention`, and their stock. Returns the topics removed."""
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM topics WHERE seed = 0 AND last_requested < ?", (time.time() - self.retention,)
+            ).rowcount
+            self._db.execute("""
+                DELETE FROM mcqs WHERE NOT EXISTS (
+                    SELECT 1 FROM topics t WHERE t.topic = mcqs.topic AND t.level = mcqs.level
+                )
+            """)
+            self._db.commit()
+            return removed
+
+    def low_stock(self):
+        with self._lock:
+            return self._db.execute("""
+                SELECT t.topic, t.level, COUNT(m.id) AS stock
+                FROM (
+                    SELECT topic, level, last_requested, seed FROM topics WHERE seed = 1
+                    UNION ALL
+                    SELECT * FROM (
+                        SELECT topic, level, last_requested, seed FROM topics
+                        WHERE seed = 0 AND last_requested >= ?
+                        ORDER BY last_requested DESC LIMIT ?
+                    )
+                ) t LEFT JOIN mcqs m ON m.topic = t.topic AND m.level = t.level
+                GROUP BY t.topic, t.level
+                HAVING stock < ?
+                ORDER BY t.seed DESC, t.last_requested DESC
+            """, (time.time() - self.active_window, self.max_topics, self.threshold)).fetchall()
+
+
+async def refill_loop(bank: MCQBank, generate, wake: asyncio.Event, interval=60, batch_size=10):
+    """
+    Background task topping up low-stock topics of the hot set with `generate(topic, noq, level)`,
+    a blocking generator such as `generate_mcqs_chunked`, which is run in a worker thread.
+    Runs every `interval` seconds or as soon as `wake` is set.
+    """
+    while True:
+        wake.clear()
+        try:
+            pruned = bank.prune()
+            if pruned:
+                logger.info(f"MCQ bank: dropped {pruned} stale topics")
+            for topic, level, stock in bank.low_stock():
+                while stock < bank.target:
+                    mcqs = await asyncio.to_thread(generate, topic, min(batch_size, bank.target - stock), level)
+                    added = bank.add(topic, level, mcqs)
+                    logger.info(f"MCQ bank refill: {topic} ({level}) +{added}")
+                    if not added:
+                        break
+                    stock += added
+        except Exception as e:
+            logger.error(f"Error refilling MCQ bank: {e}")
+        try:
+            await asyncio.wait_for(wake.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
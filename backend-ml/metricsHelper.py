@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from tracingHelper import span, start_span, end_span
+from importHelper import load_dependencies
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets (seconds) covering cache hits up to multi-minute video generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Every metric and scrape-time collector, in the order they are rendered on /metrics
+REGISTRY = []
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def format_sample(name, labelnames, values, value):
+    labels = ",".join(f'{label}="{escape_label(v)}"' for label, v in zip(labelnames, values))
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+
+class Metric:
+    """In-memory metric with optional labels, rendered in the Prometheus text format."""
+
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines += [format_sample(self.name, self.labelnames, key, value) for key, value in values]
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, count, total = self._values.get(key) or ([0] * len(self.buckets), 0, 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, count + 1, total + value)
+
+    def render(self):
+        with self._lock:
+            values = [(key, list(counts), count, total) for key, (counts, count, total) in self._values.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        bucket_labels = self.labelnames + ("le",)
+        for key, counts, count, total in values:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(format_sample(f"{self.name}_bucket", bucket_labels, key + (str(float(bound)),), bucket_count))
+            lines.append(format_sample(f"{self.name}_bucket", bucket_labels, key + ("+Inf",), count))
+            lines.append(format_sample(f"{self.name}_sum", self.labelnames, key, total))
+            lines.append(format_sample(f"{self.name}_count", self.labelnames, key, count))
+        return lines
+
+
+class StatsCollector:
+    """
+    Gauges read at scrape time from existing `stats()` dicts: `collect` returns
+    {label value: {stat: number}} and each stat becomes `<name>_<stat>{<label>="..."}`.
+    """
+
+    def __init__(self, name, documentation, label, collect, registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.collect = collect
+        registry.append(self)
+
+    def render(self):
+        try:
+            groups = self.collect()
+        except Exception as e:
+            logger.warning(f"Could not collect {self.name} metrics: {e}")
+            return []
+        by_stat = {}
+        for value, stats in groups.items():
+            for stat, number in stats.items():
+                if isinstance(number, (int, float)):
+                    by_stat.setdefault(stat, []).append((value, number))
+        lines = []
+        for stat, samples in by_stat.items():
+            metric = f"{self.name}_{stat}"
+            lines += [f"# HELP {metric} {self.documentation}: {stat}", f"# TYPE {metric} gauge"]
+            lines += [format_sample(metric, (self.label,), (value,), number) for value, number in samples]
+        return lines
+
+
+def render_metrics(registry=REGISTRY):
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+http_requests_in_flight = Gauge("genai_http_requests_in_flight", "HTTP requests currently being served")
+http_request_duration = Histogram(
+    "genai_http_request_duration_seconds",
+    "HTTP request latency until the last byte of the response, by route template",
+    ("method", "route", "status"),
+)
+upstream_in_flight = Gauge("genai_upstream_requests_in_flight", "Calls to external providers currently waiting", ("provider",))
+upstream_duration = Histogram(
+    "genai_upstream_request_duration_seconds",
+    "Latency of calls to external providers (Groq, Gemini, Serper, SerpAPI, YouTube, Wikipedia, gTTS)",
+    ("provider", "operation"),
+)
+upstream_errors = Counter("genai_upstream_errors_total", "Failed calls to external providers", ("provider", "operation", "error"))
+llm_tokens = Counter("genai_llm_tokens_total", "LLM tokens reported by the provider", ("provider", "model", "kind"))
+stage_duration = Histogram("genai_stage_duration_seconds", "Latency of internal request stages", ("stage",))
+
+
+# Record a provider call that started at `start` (a time.perf_counter() value)
+def record_upstream(provider, operation, start, error=None):
+    upstream_in_flight.dec(provider=provider)
+    upstream_duration.observe(time.perf_counter() - start, provider=provider, operation=operation)
+    if error is not None:
+        upstream_errors.inc(provider=provider, operation=operation, error=type(error).__name__)
+
+# Time a call to an external provider, also traced as a span of the current request;
+# exceptions are counted as errors and re-raised
+@contextmanager
+def track_upstream(provider, operation):
+    with span(f"{provider}.{operation}", provider=provider):
+        upstream_in_flight.inc(provider=provider)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            # A consumer that stops reading a stream early is not a provider failure
+            cancelled = isinstance(e, (GeneratorExit, asyncio.CancelledError))
+            record_upstream(provider, operation, start, None if cancelled else e)
+            raise
+        record_upstream(provider, operation, start)
+
+# Wrap a provider function so each call is timed with track_upstream
+def instrumented(provider, operation, func):
+    def wrapper(*args, **kwargs):
+        with track_upstream(provider, operation):
+            return func(*args, **kwargs)
+    return wrapper
+
+# Time an internal stage, also traced as a span of the current request
+@contextmanager
+def track_stage(stage):
+    start = time.perf_counter()
+    try:
+        with span(stage):
+            yield
+    finally:
+        stage_duration.observe(time.perf_counter() - start, stage=stage)
+
+def record_tokens(provider, model, prompt_tokens, completion_tokens):
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, provider=provider, model=model, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, provider=provider, model=model, kind="completion")
+
+
+# LangChain callback counting the tokens of every chat model call and tracing it end to end
+# (queueing and retries included; the provider attempts themselves are timed by llmScheduler);
+# built on first use so importing this module does not load LangChain
+@lru_cache(maxsize=None)
+def llm_metrics_callback(provider):
+    load_dependencies("langchain")
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMMetricsCallback(BaseCallbackHandler):
+        # Cheap and thread-safe, so run it in the caller instead of a thread pool
+        run_inline = True
+
+        def __init__(self):
+            self.calls = {}
+            self.lock = threading.Lock()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            model = (kwargs.get("metadata") or {}).get("ls_model_name") or "unknown"
+            call_span = start_span(f"{provider}.call", provider=provider, model=model)
+            with self.lock:
+                self.calls[run_id] = (model, call_span)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            with self.lock:
+                call = self.calls.pop(run_id, None)
+            if call is None:
+                return
+            model, call_span = call
+            for generations in response.generations:
+                for generation in generations:
+                    usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    record_tokens(provider, model, usage.get("input_tokens", 0), usage.get("output_tokens", 0))
+                    if call_span is not None:
+                        call_span.set(prompt_tokens=usage.get("input_tokens", 0), completion_tokens=usage.get("output_tokens", 0))
+            end_span(call_span)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            with self.lock:
+                call = self.calls.pop(run_id, None)
+            if call is None:
+                return
+            cancelled = isinstance(error, (GeneratorExit, asyncio.CancelledError))
+            end_span(call[1], None if cancelled else error)
+
+    return LLMMetricsCallback()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording in-flight requests and per-route latency. Latency runs until the
+    response has been fully sent, so streamed endpoints are measured end to end.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_requests_in_flight.dec()
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_request_duration.observe(time.perf_counter() - start, method=scope["method"], route=route, status=status)
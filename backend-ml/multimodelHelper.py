@@ -1,12 +1,25 @@
 # import speech_recognition as sr
-import google.generativeai as genai
+# from pydub import AudioSegment
+# google.generativeai, gTTS and PIL are imported on first use (see importHelper) to keep worker startup fast
 from dotenv import load_dotenv
 import os
-from gtts import gTTS
-import PIL.Image
+import logging
 import time
-from pydub import AudioSegment
+import threading
+import asyncio
+from datetime import datetime, timezone
 import tempfile
+import hashlib
+import uuid
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+from cacheHelper import TTLCache
+from metricsHelper import track_upstream, track_stage, record_tokens
+from tracingHelper import span, traced
+from importHelper import load_dependencies, load_dependencies_async
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -14,6 +27,11 @@ load_dotenv()
 # Set the Google API Key
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
+# Polling schedule (seconds) while Gemini processes an uploaded video
+VIDEO_POLL_INITIAL = float(os.getenv('VIDEO_POLL_INITIAL', 1))
+VIDEO_POLL_MAX = float(os.getenv('VIDEO_POLL_MAX', 16))
+VIDEO_PROCESSING_TIMEOUT = float(os.getenv('VIDEO_PROCESSING_TIMEOUT', 900))
+
 # Function to handle voice input using a file
 # def voice_input(audio_path):
 #     try:
@@ -48,41 +66,151 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 #         except:
 #             pass
 
-# Function to generate response from LLM model for voice chat
-def llm_model_audio(user_text):
-    genai.configure(api_key=GOOGLE_API_KEY)
+# Process-wide Gemini setup: genai is configured once and models are built once per name,
+# then shared by all requests (GenerativeModel holds no per-call state)
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-pro')
+# Optional transport ("rest" or "grpc") and endpoint override, e.g. for a local stand-in server
+GEMINI_TRANSPORT = os.getenv('GEMINI_TRANSPORT')
+GEMINI_API_ENDPOINT = os.getenv('GEMINI_API_ENDPOINT')
+gemini_lock = threading.Lock()
+gemini_configured = False
+gemini_models = {}
 
-    model = genai.GenerativeModel(model_name='gemini-1.5-pro')
-    prompt1 = """
+def configure_gemini():
+    global gemini_configured
+    load_dependencies("gemini")
+    import google.generativeai as genai
+    with gemini_lock:
+        if not gemini_configured:
+            options = {}
+            if GEMINI_TRANSPORT:
+                options["transport"] = GEMINI_TRANSPORT
+            if GEMINI_API_ENDPOINT:
+                options["client_options"] = {"api_endpoint": GEMINI_API_ENDPOINT}
+            genai.configure(api_key=GOOGLE_API_KEY, **options)
+            gemini_configured = True
+
+def get_model(model_name=GEMINI_MODEL):
+    model = gemini_models.get(model_name)
+    if model is None:
+        configure_gemini()
+        import google.generativeai as genai
+        with gemini_lock:
+            model = gemini_models.setdefault(model_name, genai.GenerativeModel(model_name=model_name))
+    return model
+
+# Count the prompt and completion tokens Gemini reports for a response
+def record_gemini_usage(model, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_tokens("gemini", model.model_name, usage.prompt_token_count, usage.candidates_token_count)
+
+# Gemini call timed and counted in the upstream metrics
+def generate_content(model, contents, **kwargs):
+    with track_upstream("gemini", "generate_content"):
+        response = model.generate_content(contents, **kwargs)
+    record_gemini_usage(model, response)
+    return response
+
+# The REST transport has no async client, so run the blocking call in a worker thread there
+async def generate_content_async(model, contents):
+    with track_upstream("gemini", "generate_content"):
+        if GEMINI_TRANSPORT == "rest":
+            response = await asyncio.to_thread(model.generate_content, contents)
+        else:
+            response = await model.generate_content_async(contents)
+    record_gemini_usage(model, response)
+    return response
+
+# Called at app startup so the first request does not pay for client setup
+def warm_gemini():
+    get_model()
+
+audio_prompt = """
     You are a helpful assistant named 'ShauryaNova' developed by Ayush Shaurya Jha. 
     You are supposed to answer accurately and precisely to the user's question. 
     Now, the user query begins:
     """
-    content = f"{prompt1}\n{user_text}"
-    response = model.generate_content(content)
-    result = response.text
-    result_cleaned = result.replace('*', '')
-    return result_cleaned
 
-# Function to generate response from LLM model for image input
-def llm_model_image(user_text, path):
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel(model_name='gemini-1.5-pro')
-    prompt1 = """
+image_prompt = """
     You are a helpful assistant named 'ShauryaNova' developed by Ayush Shaurya Jha. 
     You are supposed to answer accurately and precisely to the user's question 
     and image. Now, the user query begins:
     """
-    sample_file = PIL.Image.open(path)
-    prompt = f"{prompt1}\n{user_text}"
-    response = model.generate_content([prompt, sample_file])
+
+# Function to generate response from LLM model for voice chat
+def llm_model_audio(user_text):
+    model = get_model()
+    content = f"{audio_prompt}\n{user_text}"
+    response = generate_content(model, content)
     result = response.text
-    return result
+    result_cleaned = result.replace('*', '')
+    return result_cleaned
+
+# Open and decode the image up front so the Gemini call does not touch the disk
+def load_image(path):
+    load_dependencies("image")
+    import PIL.Image
+    with span("image.decode") as decode_span:
+        image = PIL.Image.open(path)
+        image.load()
+        if decode_span is not None:
+            decode_span.set(width=image.width, height=image.height, format=image.format or "")
+    return image
+
+# Function to generate response from LLM model for image input
+async def llm_model_image_async(user_text, path):
+    await load_dependencies_async("gemini", "image")
+    model = get_model()
+    sample_file = await asyncio.to_thread(load_image, path)
+    prompt = f"{image_prompt}\n{user_text}"
+    response = await generate_content_async(model, [prompt, sample_file])
+    return response.text
+
+# Already processed Gemini files keyed by the SHA-256 of the uploaded video,
+# so follow-up questions on the same video skip upload and processing
+video_file_cache = TTLCache(
+    maxsize=int(os.getenv('GEMINI_FILE_CACHE_SIZE', 256)),
+    ttl=int(os.getenv('GEMINI_FILE_TTL', 47 * 3600)),
+)
+
+# Upload a video to Gemini and wait until it has been processed
+def upload_video(video_path):
+    configure_gemini()
+    import google.generativeai as genai
+    logger.info(f"Uploading file: {video_path}")
+    with track_upstream("gemini", "upload_file"):
+        video_file = genai.upload_file(path=video_path)
+    logger.info(f"Completed upload: {video_file.uri}")
+
+    # Check if file processing is done, backing off exponentially between polls
+    delay = VIDEO_POLL_INITIAL
+    deadline = time.monotonic() + VIDEO_PROCESSING_TIMEOUT
+    with track_stage("gemini_video_processing"):
+        while video_file.state.name == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError("Video processing timed out")
+            logger.debug("Processing video...")
+            time.sleep(delay)
+            delay = min(delay * 2, VIDEO_POLL_MAX)
+            video_file = genai.get_file(video_file.name)
+
+    if video_file.state.name == "FAILED":
+        raise ValueError("Video processing failed")
+    return video_file
+
+# Remember a processed file until shortly before Gemini expires it
+def cache_video_file(content_hash, video_file):
+    ttl = None
+    if video_file.expiration_time:
+        ttl = (video_file.expiration_time - datetime.now(timezone.utc)).total_seconds() - 600
+    if ttl is None or ttl > 0:
+        video_file_cache.set(content_hash, video_file, ttl=ttl)
 
 # Function to generate response from LLM model for video input
-def llm_model_video(user_text, video_path):
-    genai.configure(api_key=GOOGLE_API_KEY)
-    model = genai.GenerativeModel(model_name='gemini-1.5-pro')
+def llm_model_video(user_text, video_path, content_hash=None):
+    model = get_model()
+    from google.api_core.exceptions import NotFound, PermissionDenied
 
     prompt1 = """
     You are a helpful assistant named 'ShauryaNova' developed by Ayush Shaurya Jha.
@@ -93,25 +221,138 @@ def llm_model_video(user_text, video_path):
     if not video_path:
         raise ValueError("Video path cannot be None")
 
-    print(f"Uploading file: {video_path}")
-    video_file = genai.upload_file(path=video_path)
-    print(f"Completed upload: {video_file.uri}")
+    prompt = f"{prompt1}\n{user_text}" if user_text else prompt1
 
-    # Check if file processing is done
-    while video_file.state.name == "PROCESSING":
-        print("Processing video...")
-        time.sleep(10)
-        video_file = genai.get_file(video_file.name)
+    video_file = video_file_cache.get(content_hash) if content_hash else None
+    if video_file is not None:
+        logger.info(f"Reusing processed file: {video_file.uri}")
+        try:
+            response = generate_content(model, [video_file, prompt], request_options={"timeout": 600})
+            return response.text
+        except (NotFound, PermissionDenied) as e:
+            # Deleted or expired on Gemini's side earlier than we expected
+            logger.warning(f"Cached file unavailable, uploading again: {e}")
+            video_file_cache.delete(content_hash)
 
-    if video_file.state.name == "FAILED":
-        raise ValueError("Video processing failed")
+    video_file = upload_video(video_path)
+    if content_hash:
+        cache_video_file(content_hash, video_file)
 
-    prompt = f"{prompt1}\n{user_text}" if user_text else prompt1
-    response = model.generate_content([video_file, prompt], request_options={"timeout": 600})
+    response = generate_content(model, [video_file, prompt], request_options={"timeout": 600})
     result = response.text
     return result
 
-# Function to convert text response to speech
-def text_to_speech(text):
-    tts = gTTS(text=text, lang="en")
-    tts.save("speech.mp3")
+# Synthesized speech is stored content-addressed, one file per (text, language)
+AUDIO_DIR = os.getenv('AUDIO_DIR', 'audio_cache')
+AUDIO_CACHE_MAX_BYTES = int(os.getenv('AUDIO_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+def audio_id_for(text, lang="en"):
+    return hashlib.sha256(f"{lang}\n{text}".encode("utf-8")).hexdigest()[:32]
+
+def audio_path(audio_id):
+    return os.path.join(AUDIO_DIR, f"{audio_id}.mp3")
+
+# Mark a cached clip as just used, since eviction goes by mtime; False if it is not cached
+def touch_audio(path):
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+# Drop the least recently used clips once the cache grows past AUDIO_CACHE_MAX_BYTES
+def evict_audio_cache(max_bytes=AUDIO_CACHE_MAX_BYTES):
+    clips = []
+    for name in os.listdir(AUDIO_DIR):
+        if name.endswith(".mp3"):
+            try:
+                stat = os.stat(os.path.join(AUDIO_DIR, name))
+                clips.append((stat.st_mtime, stat.st_size, name))
+            except FileNotFoundError:
+                pass
+    total = sum(size for _, size, _ in clips)
+    for _, size, name in sorted(clips):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(os.path.join(AUDIO_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+# Speech is synthesized in sentence chunks of at most TTS_CHUNK_CHARS characters, TTS_WORKERS at a time
+TTS_CHUNK_CHARS = int(os.getenv('TTS_CHUNK_CHARS', 300))
+tts_pool = ThreadPoolExecutor(max_workers=int(os.getenv('TTS_WORKERS', 4)), thread_name_prefix="tts")
+
+# Texts registered for synthesis, so audio can be produced on demand when first requested;
+# kept on disk so an audio id stays valid across workers and restarts
+speech_texts = TTLCache(
+    maxsize=int(os.getenv('SPEECH_TEXT_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('SPEECH_TEXT_TTL', 7 * 86400)),
+    path=os.getenv('SPEECH_TEXT_PATH', os.path.join(AUDIO_DIR, 'speech_texts.db')),
+    max_disk_entries=int(os.getenv('SPEECH_TEXT_MAX_ENTRIES', 100000)),
+)
+
+# Group sentences into chunks of at most max_chars (a single longer sentence stays whole)
+def split_sentences(text, max_chars=TTS_CHUNK_CHARS):
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+def synthesize_chunk(text, lang="en"):
+    load_dependencies("speech")
+    from gtts import gTTS
+    buffer = io.BytesIO()
+    with track_upstream("gtts", "synthesize"):
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+    return buffer.getvalue()
+
+def register_speech(text, lang="en"):
+    audio_id = audio_id_for(text, lang)
+    speech_texts.set(audio_id, (text, lang))
+    return audio_id
+
+def registered_speech(audio_id):
+    return speech_texts.get(audio_id)
+
+def stream_speech(text, lang="en", chunk_size=64 * 1024):
+    """
+    Yield MP3 audio for `text` progressively: sentence chunks are synthesized concurrently on
+    tts_pool and yielded in order as soon as each is ready, so playback can start after the
+    first one. The complete clip is then stored in the audio cache.
+    """
+    path = audio_path(audio_id_for(text, lang))
+    if touch_audio(path):
+        with open(path, "rb") as f:
+            while data := f.read(chunk_size):
+                yield data
+        return
+    futures = [tts_pool.submit(traced(synthesize_chunk), chunk, lang) for chunk in split_sentences(text)]
+    parts = []
+    try:
+        for future in futures:
+            parts.append(future.result())
+            yield parts[-1]
+    finally:
+        for future in futures:
+            future.cancel()
+    os.makedirs(AUDIO_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join(parts))
+    os.replace(tmp_path, path)
+    evict_audio_cache()
+
+# Function to convert text response to speech, returns the audio id of the clip
+def text_to_speech(text, lang="en"):
+    for _ in stream_speech(text, lang):
+        pass
+    return audio_id_for(text, lang)
@@ -0,0 +1,54 @@
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token for English text when tiktoken is not installed
+CHARS_PER_TOKEN = 4
+
+
+# tiktoken's cl100k_base is not the Llama/Mixtral tokenizer, but tracks it far better than a
+# character ratio; it is optional and loaded on first use
+@lru_cache(maxsize=None)
+def get_encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.info(f"tiktoken unavailable, estimating tokens from characters: {e}")
+        return None
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoder = get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def fit_history(history, budget, format_turn, pin_first=False):
+    """
+    Render the most recent turns of `history` that fit in `budget` tokens, oldest dropped first.
+    With `pin_first` the first turn (usually where the student states the problem) is kept
+    ahead of the recent ones when it fits. Dropped turns are replaced by a one-line note.
+    Returns the rendered text and the number of turns left out.
+    """
+    lines = [format_turn(turn) for turn in history]
+    # +1 for the newline joining the turns
+    costs = [count_tokens(line) + 1 for line in lines]
+    pinned = []
+    first = 0
+    if pin_first and lines and costs[0] <= budget:
+        pinned = [lines[0]]
+        budget -= costs[0]
+        first = 1
+    recent = []
+    for i in range(len(lines) - 1, first - 1, -1):
+        if costs[i] > budget:
+            break
+        budget -= costs[i]
+        recent.append(lines[i])
+    recent.reverse()
+    omitted = len(lines) - len(pinned) - len(recent)
+    note = [f"({omitted} earlier turns omitted)"] if omitted else []
+    return "\n".join(pinned + note + recent), omitted
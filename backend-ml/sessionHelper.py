@@ -0,0 +1,89 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.summary = ""
+        # Turns already handed to the summarizer but not yet folded into the summary
+        self.pending = []
+        # Most recent turns, sent verbatim to the model
+        self.turns = []
+        self.lock = asyncio.Lock()
+        self.summarizing = None
+        self.last_access = time.monotonic()
+
+    def history(self):
+        return self.pending + self.turns
+
+
+class SessionStore:
+    """
+    In-memory conversation sessions for a single worker.
+    Only the last `recent_turns` turns are kept verbatim; older turns are rolled into a running
+    summary in the background by `summarize(summary, turns) -> new_summary` (an async callable),
+    so the prompt stays bounded however long a session runs.
+    """
+
+    def __init__(self, summarize, recent_turns=6, ttl=3600, max_sessions=10000):
+        self.summarize = summarize
+        self.recent_turns = recent_turns
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_access <= self.ttl:
+                break
+            self._sessions.pop(session_id)
+
+    def get(self, session_id):
+        self._prune()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_access = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def get_or_create(self, session_id=None):
+        session = self.get(session_id) if session_id else None
+        if session is None:
+            session = Session(session_id or uuid.uuid4().hex)
+            self._sessions[session.session_id] = session
+            self._prune()
+        return session
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(self, session, student, assistant):
+        session.turns.append({"student": student, "assistant": assistant})
+        overflow = len(session.turns) - self.recent_turns
+        if overflow > 0:
+            session.pending.extend(session.turns[:overflow])
+            del session.turns[:overflow]
+        if session.pending and (session.summarizing is None or session.summarizing.done()):
+            session.summarizing = asyncio.create_task(self._summarize(session))
+
+    async def _summarize(self, session):
+        while session.pending:
+            batch = list(session.pending)
+            try:
+                session.summary = await self.summarize(session.summary, batch)
+            except Exception as e:
+                logger.error(f"Error summarizing session {session.session_id}: {e}")
+                # Keep the prompt bounded even if the summarizer keeps failing
+                excess = len(session.pending) - self.recent_turns
+                if excess > 0:
+                    del session.pending[:excess]
+                return
+            del session.pending[:len(batch)]
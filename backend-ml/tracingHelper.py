@@ -0,0 +1,262 @@
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# "none" (default, tracing off), "json" (JSON lines appended to TRACE_FILE) or "otlp" (OTLP/HTTP JSON)
+TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none').lower()
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+# Fraction of requests whose spans are recorded and exported
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', 1.0))
+TRACE_SERVICE_NAME = os.getenv('TRACE_SERVICE_NAME', 'genai-backend-ml')
+TRACE_BATCH_SIZE = int(os.getenv('TRACE_BATCH_SIZE', 256))
+TRACE_FLUSH_INTERVAL = float(os.getenv('TRACE_FLUSH_INTERVAL', 2))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class TraceContext:
+    """What a request passes down to its stages: the request id, the trace it belongs to and the current span."""
+
+    __slots__ = ("request_id", "trace_id", "span_id", "sampled")
+
+    def __init__(self, request_id, trace_id, span_id=None, sampled=False):
+        self.request_id = request_id
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.sampled = sampled
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def current_request_id():
+    trace = current_trace.get()
+    return trace.request_id if trace else None
+
+# Start a new trace for an incoming request, reusing the caller's request id when it is well formed
+def start_trace(request_id=None):
+    if not request_id or not VALID_REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    if re.fullmatch(r"[0-9a-f]{32}", request_id):
+        trace_id = request_id
+    else:
+        trace_id = hashlib.sha256(request_id.encode("utf-8")).hexdigest()[:32]
+    sampled = TRACE_EXPORTER != "none" and random.random() < TRACE_SAMPLE_RATE
+    trace = TraceContext(request_id, trace_id, sampled=sampled)
+    current_trace.set(trace)
+    return trace
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "request_id", "kind", "start", "end", "attributes", "error")
+
+    def __init__(self, name, trace, kind="internal", attributes=None):
+        self.name = name
+        self.trace_id = trace.trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = trace.span_id
+        self.request_id = trace.request_id
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start,
+            "end_ns": self.end,
+            "duration_ms": (self.end - self.start) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# Begin a span under the current one without making it current (for callbacks split across
+# start and end hooks); returns None when the request is not sampled
+def start_span(name, kind="internal", **attributes):
+    trace = current_trace.get()
+    if trace is None or not trace.sampled:
+        return None
+    return Span(name, trace, kind, attributes)
+
+def end_span(span, error=None):
+    if span is None:
+        return
+    span.end = time.time_ns()
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    exporter.submit(span)
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """
+    Time a stage of the current request as a child of the current span. Yields the Span (or None
+    when the request is not sampled) so attributes can be added while it runs.
+    """
+    current = start_span(name, kind, **attributes)
+    if current is None:
+        yield None
+        return
+    parent = current_trace.get()
+    # set() rather than reset(token): generators driven from a thread pool resume in another context
+    current_trace.set(TraceContext(parent.request_id, parent.trace_id, current.span_id, True))
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, e)
+        raise
+    finally:
+        current_trace.set(parent)
+    end_span(current)
+
+# Bind fn to a copy of the current context, for executors that do not propagate it
+# (ThreadPoolExecutor.submit); asyncio.to_thread and Starlette's thread pool already do
+def traced(fn):
+    context = contextvars.copy_context()
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return wrapper
+
+
+def otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_span(span):
+    attributes = dict(span.attributes, request_id=span.request_id)
+    payload = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": 2 if span.kind == "server" else 1,
+        "startTimeUnixNano": str(span.start),
+        "endTimeUnixNano": str(span.end),
+        "attributes": [{"key": key, "value": otlp_value(value)} for key, value in attributes.items()],
+        "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+    }
+    if span.parent_id:
+        payload["parentSpanId"] = span.parent_id
+    return payload
+
+
+class SpanExporter:
+    """
+    Batches finished spans on a background thread and writes them as JSON lines or posts them
+    to an OTLP/HTTP collector, so exporting never adds latency to a request. Spans are dropped
+    (with a warning) if the queue is full or the collector is unreachable.
+    """
+
+    def __init__(self, kind, batch_size=TRACE_BATCH_SIZE, interval=TRACE_FLUSH_INTERVAL):
+        self.kind = kind
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=batch_size * 20)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("Span export queue is full, dropping span")
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self.export(batch)
+            except Exception as e:
+                logger.warning(f"Could not export {len(batch)} spans: {e}")
+
+    def export(self, batch):
+        if self.kind == "json":
+            with open(TRACE_FILE, "a") as f:
+                f.writelines(json.dumps(span.to_dict()) + "\n" for span in batch)
+        elif self.kind == "otlp":
+            import requests
+            payload = {"resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "tracingHelper"}, "spans": [otlp_span(span) for span in batch]}],
+            }]}
+            requests.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=5).raise_for_status()
+
+
+exporter = SpanExporter(TRACE_EXPORTER)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware that gives every request an id (taken from X-Request-ID when the client sends
+    one), returns it in the X-Request-ID response header and, when sampled, records a root span
+    covering the whole request that the handlers' stage spans nest under.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        trace = start_trace(headers.get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1"))
+        status = 500
+
+        async def send_with_request_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER.lower().encode(), trace.request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        with span(f"{scope['method']} {scope['path']}", kind="server", **{"http.method": scope["method"]}) as root:
+            await self.app(scope, receive, send_with_request_id)
+            if root is not None:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                root.set(**{"http.route": route or "unmatched", "http.status_code": status})
@@ -0,0 +1,113 @@
+import glob
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from tracingHelper import span
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.getenv('UPLOAD_DIR') or tempfile.gettempdir()
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv('MAX_IMAGE_UPLOAD_BYTES', 20 * 1024 * 1024))
+MAX_VIDEO_UPLOAD_BYTES = int(os.getenv('MAX_VIDEO_UPLOAD_BYTES', 500 * 1024 * 1024))
+UPLOAD_PREFIX = "genai_upload_"
+# Allowance for the form's other fields and multipart framing on top of the file size limit
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+# File extension of an uploaded file, restricted to something safe to put in a path
+def upload_suffix(filename, default):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if 1 < len(ext) <= 10 and ext[1:].isalnum() else default
+
+def remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+async def save_upload(upload, suffix, max_bytes):
+    """
+    Copy an UploadFile to a uniquely named temp file in UPLOAD_CHUNK_SIZE chunks, so memory
+    stays flat regardless of upload size. Uploads larger than `max_bytes` are rejected with 413.
+    Returns the path and the SHA-256 hex digest of the content; the caller must remove the file.
+    """
+    f = tempfile.NamedTemporaryFile(delete=False, dir=UPLOAD_DIR, prefix=UPLOAD_PREFIX, suffix=suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with span("upload.save") as save_span, f:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+                digest.update(chunk)
+                f.write(chunk)
+            if save_span is not None:
+                save_span.set(bytes=size)
+    except BaseException:
+        remove_file(f.name)
+        raise
+    return f.name, digest.hexdigest()
+
+# Save an upload for the duration of a `with` block, then delete it
+@asynccontextmanager
+async def temp_upload(upload, suffix, max_bytes):
+    path, _ = await save_upload(upload, suffix, max_bytes)
+    try:
+        yield path
+    finally:
+        remove_file(path)
+
+# Remove uploads left behind by a crashed worker
+def cleanup_stale_uploads(max_age=86400):
+    cutoff = time.time() - max_age
+    for path in glob.glob(os.path.join(UPLOAD_DIR, UPLOAD_PREFIX + "*")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Could not remove stale upload {path}: {e}")
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware capping request bodies by path (`limits` maps a path to the largest file
+    accepted there) before the multipart form is parsed and spooled to disk. A Content-Length
+    over the limit gets a 413 without reading the body; bodies sent without one fail with 413
+    as soon as they grow past it. save_upload still enforces the exact per-file limit.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = {path: max_bytes + MULTIPART_OVERHEAD_BYTES for path, max_bytes in limits.items()}
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            response = JSONResponse({"detail": f"Request body exceeds the {limit} byte limit"}, status_code=413)
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised by FastAPI's body parsing and answered by its exception handler
+                    raise HTTPException(status_code=413, detail=f"Request body exceeds the {limit} byte limit")
+            return message
+
+        await self.app(scope, limited_receive, send)